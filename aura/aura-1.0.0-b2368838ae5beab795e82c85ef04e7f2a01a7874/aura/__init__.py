@@ -1,4 +1,4 @@
 from .version import __version__
 from .config import VIDEOS_NAME
 
-__all__ = ["cli", "compat", "config", "exceptions", "utils", "version", "video", "transformers", "commands", "VIDEOS_NAME"]
+__all__ = ["cli", "compat", "config", "exceptions", "fast_config", "hwaccel", "utils", "version", "video", "transformers", "commands", "VIDEOS_NAME"]
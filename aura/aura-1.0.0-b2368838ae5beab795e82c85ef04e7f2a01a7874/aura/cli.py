@@ -1,75 +1,116 @@
 from __future__ import print_function
-import copy
 import importlib
 import logging
 import os
 import sys
-from pkg_resources import iter_entry_points
 
 import click
 
 from aura import __version__, VIDEOS_NAME
-from aura.compat import ConfigParser
+from aura.compat import entry_points, scandir
+from aura.fast_config import FastConfigParser
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'], obj={'app_version': __version__})
 CONFIG_DEFAULTS = dict(verify_certs="True")
 WIN = sys.platform.startswith('win')
 VERBOSE_LOG_LEVEL = logging.INFO - 1
+ERROR_STYLE = dict(fg="red", bold=True)
+WARN_STYLE = dict(fg="yellow")
+DEBUG_STYLE = dict(fg="green")
 log = logging.getLogger("aura")
+_plugins_cache = {}
+_config_file_cache = {}
+
+# Python 2 needs the command names to be a str when importing, so work out how to fix up the names once
+if sys.version_info[0] == 2:
+    def _fix_command_name(name):
+        return name.encode('ascii', 'replace')
+else:
+    def _fix_command_name(name):
+        return name
+
+
+def _find_builtin_commands(commands_dir):
+    """Finds the names of the built-in commands (the cmd_*.py modules) in the commands directory"""
+    rv = set()
+    for entry in scandir(commands_dir):
+        filename = entry.name
+        if filename.endswith('.py') and filename.startswith("cmd_"):
+            command_name = filename[4:-3].replace("_", "-")
+            rv.add(command_name)
+    return tuple(sorted(rv))
 
 
 class ExtendableCLI(click.MultiCommand):
     """A class that allows for the application to be extended with additional commands by dynamically loading the commands"""
     commands_dir = os.path.join(os.path.dirname(__file__), 'commands')
+    # The built-in commands are fixed for an install, so only scan the commands directory once
+    builtin_commands = _find_builtin_commands(commands_dir)
     plugin_group_name = "aura.commands"
 
+    def parse_args(self, ctx, args):
+        rv = super(ExtendableCLI, self).parse_args(ctx, args)
+        # Record if help was requested for a sub command, as the sub command args are cleared before the callback is invoked
+        ctx.meta['aura.help_requested'] = any(x in ctx.help_option_names for x in ctx.args)
+        return rv
+
     def list_commands(self, ctx):
-        rv = set()
-        for filename in os.listdir(self.commands_dir):
-            if filename.endswith('.py') and filename.startswith("cmd_"):
-                command_name = filename[4:-3].replace("_", "-")
-                rv.add(command_name)
-        for plugin in iter_entry_points(self.plugin_group_name):
-            rv.add(plugin.name)
-        return sorted(rv)
+        return sorted(set(self.builtin_commands).union(self.get_plugins()))
 
     def get_command(self, ctx, name):
-        name = name.replace("-", "_")
-        if sys.version_info[0] == 2:
-            name = name.encode('ascii', 'replace')
+        name = _fix_command_name(name.replace("-", "_"))
 
-        # check the plugins first
-        for plugin in iter_entry_points(self.plugin_group_name):
-            if plugin.name == name:
-                return plugin.load()
-
-        # try importing a built-in command
+        # try importing a built-in command first, as that doesn't require the plugins to be looked up
         try:
             mod = importlib.import_module('aura.commands.cmd_' + name)
         except ImportError as e:
+            # Not a built-in command, so check the plugins
+            plugin = self.get_plugins().get(name)
+            if plugin is not None:
+                return plugin.load()
+
             log.error(str(e))
             return
         return mod.cli
 
+    def get_plugins(self):
+        """Gets the plugin command entry points, keyed by the command name. The entry points are only looked up once per process."""
+        # Cache this as the installed plugins won't change while running and looking up the entry points is slow
+        if self.plugin_group_name not in _plugins_cache:
+            _plugins_cache[self.plugin_group_name] = dict((plugin.name, plugin) for plugin in entry_points(self.plugin_group_name))
+        return _plugins_cache[self.plugin_group_name]
+
 
 # See http://stackoverflow.com/a/2205909/1330640
 class ColoredConsoleHandler(logging.StreamHandler, object):
-    def emit(self, record):
-        # Need to make a actual copy of the record
-        # to prevent altering the message for other loggers
-        myrecord = copy.copy(record)
-
+    def __init__(self, stream=None):
+        super(ColoredConsoleHandler, self).__init__(stream)
         # Only add colors if we are not using windows
-        if not WIN:
-            levelno = myrecord.levelno
-            if levelno >= logging.ERROR:
-                myrecord.msg = click.style(str(myrecord.msg), fg="red", bold=True)
-            elif levelno >= logging.WARN:
-                myrecord.msg = click.style(str(myrecord.msg), fg="yellow")
-            elif levelno == logging.DEBUG:
-                myrecord.msg = click.style(str(myrecord.msg), fg="green")
-        super(ColoredConsoleHandler, self).emit(myrecord)
+        self._colorize = not WIN
+
+    def _get_level_style(self, levelno):
+        if levelno >= logging.ERROR:
+            return ERROR_STYLE
+        elif levelno >= logging.WARN:
+            return WARN_STYLE
+        elif levelno == logging.DEBUG:
+            return DEBUG_STYLE
+        else:
+            return None
+
+    def format(self, record):
+        style = self._get_level_style(record.levelno) if self._colorize else None
+        if style is None:
+            return super(ColoredConsoleHandler, self).format(record)
+
+        # Style just the message and restore it afterwards, so the record isn't altered for other handlers
+        msg, args = record.msg, record.args
+        record.msg, record.args = click.style(record.getMessage(), **style), None
+        try:
+            return super(ColoredConsoleHandler, self).format(record)
+        finally:
+            record.msg, record.args = msg, args
 
 
 def print_version(ctx, param, value):
@@ -91,7 +132,7 @@ def _init_config_parser(ctx, defaults=None, sections=None):
     """Creates a config parser instance and adds the default sections"""
     app_name = ctx.find_root().info_name
 
-    config = ConfigParser(defaults=defaults)
+    config = FastConfigParser(defaults=defaults)
     config.add_section(app_name)
     config.add_section(VIDEOS_NAME)
 
@@ -102,6 +143,20 @@ def _init_config_parser(ctx, defaults=None, sections=None):
     return config
 
 
+def _read_config_file(config, config_file):
+    """Reads a configuration file into a config parser, reusing the previously parsed content if the file hasn't changed"""
+    # Cache this as the files rarely change and it's faster than parsing them for every command invocation
+    stat = os.stat(config_file)
+    file_key = (stat.st_mtime, stat.st_size)
+    cached = _config_file_cache.get(config_file)
+    if cached is None or cached[0] != file_key:
+        parsed_config = FastConfigParser()
+        parsed_config.read(config_file)
+        cached = _config_file_cache[config_file] = (file_key, parsed_config)
+
+    config.update(cached[1])
+
+
 def init_logging(debug, verbose):
     """Sets up the logging format and log level"""
     if verbose:
@@ -150,7 +205,7 @@ def init_sys_config(ctx, config_file=None, config_defaults=CONFIG_DEFAULTS, conf
         ctx.exit(1)
 
     log.debug("Loading global configuration from %s", config_file)
-    config.read(config_file)
+    _read_config_file(config, config_file)
     ctx.obj['CONFIG'] = config
     return config
 
@@ -172,7 +227,7 @@ def init_user_config(ctx, config_file, config_defaults=None, config_sections=Non
         ctx.exit(1)
     elif os.path.isfile(config_file):
         log.debug("Loading user configuration from %s", config_file)
-        config.read(config_file)
+        _read_config_file(config, config_file)
 
     ctx.obj['USER_CONFIG'] = config
     return config
@@ -221,7 +276,7 @@ def init_cli(ctx, config, debug=False, verbose=False, app_defaults=CONFIG_DEFAUL
 @click.pass_context
 def cli(ctx, config, debug, verbose):
     # If help is in a sub command, don't setup the logging and config
-    if not any(x in ctx.help_option_names for x in ctx.args):
+    if not ctx.meta.get('aura.help_requested'):
         init_cli(ctx, config, debug, verbose)
 
 
@@ -1,19 +1,30 @@
 import logging
 import sys
 
-from lxml import etree
-from lxml.etree import XMLSyntaxError, XIncludeError
-
 from aura import utils
-from aura.compat import ConfigParser
+from aura.fast_config import FastConfigParser
 from aura.exceptions import InvalidInputException
 from aura.transformers import init_transformer
 
 
+class _ClassLogger(object):
+    """A descriptor that provides a logger named after the class it's accessed from, so the logger is only looked up once per class"""
+    def __init__(self):
+        self._loggers = {}
+
+    def __get__(self, instance, owner):
+        try:
+            return self._loggers[owner]
+        except KeyError:
+            logger = self._loggers[owner] = logging.getLogger(owner.__module__ + "." + owner.__name__)
+            return logger
+
+
 class BaseCommand(object):
+    log = _ClassLogger()
+
     def __init__(self, ctx):
         self.ctx = ctx
-        self.log = logging.getLogger(self.__module__ + "." + self.__class__.__name__)
         self.app_name = ctx.find_root().info_name
 
     def print_parsed_debug_details(self):
@@ -22,11 +33,11 @@ class BaseCommand(object):
 
     def debug_enabled(self):
         """Checks if the --debug option was passed to the application"""
-        return ("DEBUG" in self.ctx.obj and self.ctx.obj["DEBUG"]) and True or False
+        return bool(self.ctx.obj.get("DEBUG"))
 
     def verbose_enabled(self):
         """Checks if the --verbose option was passed to the application"""
-        return ("VERBOSE" in self.ctx.obj and self.ctx.obj["VERBOSE"]) and True or False
+        return bool(self.ctx.obj.get("VERBOSE"))
 
     def execute(self, *args, **kwargs):
         """Perform the actions for the command"""
@@ -56,7 +67,7 @@ class BaseCommand(object):
         """
         Gets the resolved config based on reading from various different locations.
 
-        :return: A ConfigParser object containing the resolved configuration.
+        :return: A FastConfigParser object containing the resolved configuration.
         """
         if 'FINAL_CONFIG' in self.ctx.obj:
             return self.ctx.obj['FINAL_CONFIG']
@@ -66,20 +77,17 @@ class BaseCommand(object):
             user_config = self.ctx.obj['USER_CONFIG']
 
             # Build the config
-            final_config = ConfigParser()
+            final_config = FastConfigParser()
 
-            for section in set(config.sections() + user_config.sections()):
+            for section in set(config.sections()).union(user_config.sections()):
                 final_config.add_section(section)
 
-                # Copy the global config values
-                if config.has_section(section):
-                    for (key, value) in config.items(section, raw=True):
-                        final_config.set(section, key, str(value))
-
-                # Copy the user config values
-                if user_config.has_section(section):
-                    for (key, value) in user_config.items(section, raw=True):
-                        final_config.set(section, key, str(value))
+                # Copy the global config values and then the user config values. Note: The values are already strings, so they can be
+                # copied as is.
+                for section_config in (config, user_config):
+                    if section_config.has_section(section):
+                        for (key, value) in section_config.items(section, raw=True):
+                            final_config.set(section, key, value)
 
             self.ctx.obj['FINAL_CONFIG'] = final_config
             return final_config
@@ -104,6 +112,8 @@ class BaseXMLFeedCommand(BaseCommand):
     def print_parsed_debug_details(self):
         """Prints information useful for debugging the command"""
         super(BaseXMLFeedCommand, self).print_parsed_debug_details()
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
         if self.lang:
             self.log.debug("--lang is %s", self.lang)
         if self.doc_uuid:
@@ -127,6 +137,10 @@ class BaseXMLFeedCommand(BaseCommand):
 
         :return:
         """
+        # Import lxml here, as it's only needed by the commands that use the XML feed
+        from lxml import etree
+        from lxml.etree import XMLSyntaxError, XIncludeError
+
         # Get the XML file
         xml_file = self.transformer.get_build_main_file(self.lang, self.build_format, self.build_config)
 
@@ -156,6 +170,8 @@ class BaseXMLFeedCommand(BaseCommand):
         :param xml_feed: The XML feed to convert to a string and save.
         :type xml_feed:  etree._ElementTree
         """
+        from lxml import etree
+
         # Get the XML file name/path
         xml_file = self.transformer.get_build_main_file(self.lang, self.build_format, config=self.build_config)
 
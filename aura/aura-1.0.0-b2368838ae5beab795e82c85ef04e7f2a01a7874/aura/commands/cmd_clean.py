@@ -1,3 +1,5 @@
+import logging
+
 import click
 
 from aura import transformers
@@ -23,6 +25,8 @@ class CleanCommand(BaseCommand):
 
     def print_parsed_debug_details(self):
         """Prints information useful for debugging the command"""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
         if self.source_format:
             self.log.debug("--type is %s", self.source_format)
 
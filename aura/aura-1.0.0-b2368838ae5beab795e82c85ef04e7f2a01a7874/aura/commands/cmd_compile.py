@@ -1,11 +1,13 @@
+import logging
 import os.path
-import tarfile
-import time
 
 import click
 
 from aura import transformers, utils
 from aura.commands import BaseCommand, normalize_lang
+from aura.compat import basestring
+
+ARCHIVE_BUFFER_SIZE = 1 << 20
 
 
 @click.command("compile", short_help="Builds the book locally.")
@@ -45,7 +47,7 @@ class CompileCommand(BaseCommand):
         super(CompileCommand, self).__init__(ctx)
         self.lang = lang
         self.source_lang = source_lang
-        if isinstance(build_formats, str) or isinstance(build_formats, unicode):
+        if isinstance(build_formats, basestring):
             self.build_formats = (build_formats,)
         else:
             self.build_formats = build_formats
@@ -60,6 +62,8 @@ class CompileCommand(BaseCommand):
 
     def print_parsed_debug_details(self):
         """Prints information useful for debugging the command"""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
         if self.source_lang:
             self.log.debug("--src-lang is %s", self.source_lang)
         if self.lang:
@@ -123,6 +127,11 @@ class CompileCommand(BaseCommand):
 
     def archive_build_files(self):
         """"""
+        # Import these here, as they are only needed when archiving
+        import gzip
+        import tarfile
+        import time
+
         # Build up the filename/path
         doc_id = self.transformer.get_doc_id(self.build_config, self.lang)
         title, product, version = self.transformer.get_npv(self.build_config)
@@ -134,8 +143,14 @@ class CompileCommand(BaseCommand):
         if not os.path.exists(archive_dir):
             os.makedirs(archive_dir)
 
-        # Archive the files
-        with tarfile.open(archive_file, 'w:gz') as archive:
+        # Archive the files. Note: The archive is written as a stream, since nothing needs to be read back or seeked while writing, and
+        # the fastest gzip level is used as compressing the large html builds at the default level takes far longer for little gain
+        with open(archive_file, 'wb', ARCHIVE_BUFFER_SIZE) as archive_fd, \
+                gzip.GzipFile(fileobj=archive_fd, mode='wb', compresslevel=1) as gzip_fd, \
+                tarfile.open(fileobj=gzip_fd, mode='w|', bufsize=ARCHIVE_BUFFER_SIZE) as archive:
+            # Copy the file content in larger chunks than the default 16KiB (only used by Python 3.8+)
+            archive.copybufsize = ARCHIVE_BUFFER_SIZE
+
             # Add the directory to store the files
             title_dir = utils.clean_for_rpm_name(title)
             t_info = tarfile.TarInfo(title_dir)
@@ -152,11 +167,6 @@ class CompileCommand(BaseCommand):
                 else:
                     build_files_dir = self.transformer.get_build_dir(self.lang, build_format)
                     format_archive_dir = os.path.join(title_dir, build_format)
-                    t_format_info = archive.gettarinfo(build_files_dir, format_archive_dir)
-                    archive.addfile(t_format_info)
-                    for root, dirs, files in os.walk(build_files_dir):
-                        archive_root = os.path.join(format_archive_dir, root.replace(build_files_dir, ""))
-                        for file_path in files:
-                            archive.add(os.path.join(root, file_path), os.path.join(archive_root, file_path))
+                    archive.add(build_files_dir, format_archive_dir, recursive=True)
 
         self.log.info("Successfully archived the built files into %s", archive_file)
@@ -1,3 +1,4 @@
+import logging
 import sys
 
 import click
@@ -59,6 +60,8 @@ class TranslateCommand(BaseCommand):
 
     def print_parsed_debug_details(self):
         """Prints information useful for debugging the command"""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
         if self.source_lang:
             self.log.debug("--src-lang is %s", self.source_lang)
         if self.langs:
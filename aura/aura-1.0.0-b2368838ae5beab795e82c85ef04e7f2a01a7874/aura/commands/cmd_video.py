@@ -1,10 +1,11 @@
+import logging
 import sys
 
 import click
 
-from aura import video, utils
-from aura.video import VideoTranscoder
 from aura.commands.base import BaseCommand
+from aura.hwaccel import HWAccel
+
 
 
 @click.group("video", short_help="Subcommands for interacting with videos.")
@@ -15,24 +16,41 @@ def cli():
 
 @cli.command("transcode", short_help="Takes a high definition mp4 video and converts it to OGG and a standard definition mp4.")
 @click.option("--yes", "-y", help="Answer yes to any y/N questions.", is_flag=True, default=False)
+@click.option("--threads", help="The number of threads ffmpeg should use. Defaults to 0, which uses all available CPUs.", type=int,
+              default=0)
+@click.option("--hwaccel", help="The hardware acceleration to use when encoding MP4 videos. \"auto\" will use the first one ffmpeg " +
+              "supports. Defaults to none.", type=click.Choice(HWAccel.CHOICES), default=HWAccel.NONE)
+@click.option("--crf", help="The constant rate factor to use when encoding MP4 videos, where lower values give a higher quality. " +
+              "When using hardware acceleration, it's converted to the encoder's quality setting. Defaults to 22.",
+              type=click.IntRange(0, 51), default=22)
 @click.argument("video_file", "VFILE", metavar="VFILE", type=click.Path(exists=True, dir_okay=False, resolve_path=True))
 @click.pass_context
-def transcode_videos(ctx, yes, video_file):
+def transcode_videos(ctx, yes, threads, hwaccel, crf, video_file):
     """Takes a high definition mp4 video and converts it to OGG and a standard definition mp4."""
-    cmd = VideoTranscodeCommand(ctx, yes, video_file)
+    cmd = VideoTranscodeCommand(ctx, yes, video_file, threads, hwaccel, crf)
     cmd.execute()
 
 
 class VideoTranscodeCommand(BaseCommand):
-    def __init__(self, ctx, answer_yes, video_file):
+    def __init__(self, ctx, answer_yes, video_file, threads=0, hwaccel=HWAccel.NONE, crf=22):
         super(VideoTranscodeCommand, self).__init__(ctx)
         self.answer_yes = answer_yes
         self.video_file = video_file
+        self.threads = threads
+        self.hwaccel = hwaccel
+        self.crf = crf
 
     def print_parsed_debug_details(self):
         """Prints information useful for debugging the command"""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
         if self.answer_yes:
             self.log.debug("--yes is True")
+        if self.threads:
+            self.log.debug("--threads is %s", self.threads)
+        if self.hwaccel != HWAccel.NONE:
+            self.log.debug("--hwaccel is %s", self.hwaccel)
+        self.log.debug("--crf is %s", self.crf)
         if self.video_file:
             self.log.debug("VFILE is %s", self.video_file)
 
@@ -40,8 +58,13 @@ class VideoTranscodeCommand(BaseCommand):
         """Perform the actions for the video upload command"""
         super(VideoTranscodeCommand, self)._execute()
 
+        # Import the video modules here, as they depend on PIL and numpy which are slow to import and aren't needed to list/describe the
+        # command
+        from aura import utils, video
+
         # Check to make sure ffmpeg is installed
-        if utils.which("ffmpeg") is None:
+        ffmpeg = utils.which("ffmpeg")
+        if ffmpeg is None:
             self.log.error("ffmpeg is not currently installed and is needed to be able to transcode videos. " +
                            "Please ensure it is installed and try again")
             sys.exit(-1)
@@ -50,7 +73,8 @@ class VideoTranscodeCommand(BaseCommand):
         video.verify_input_video(self.video_file)
 
         # Transcode the video file
-        transcoder = VideoTranscoder(True, self.verbose_enabled(), self.debug_enabled())
+        transcoder = video.VideoTranscoder(True, self.verbose_enabled(), self.debug_enabled(), self.threads, ffmpeg,
+                                           self.hwaccel, self.crf)
         video.transcode(transcoder, self.video_file, self.answer_yes)
 
         # Print a success message
@@ -3,6 +3,11 @@ import subprocess
 import sys
 import warnings
 
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
 _ver = sys.version_info
 is_py2 = (_ver[0] == 2)
 is_py3 = (_ver[0] == 3)
@@ -11,6 +16,7 @@ if is_py2:
     import urllib as urllib
     from urlparse import urljoin, urlparse
     from ConfigParser import ConfigParser, RawConfigParser, SafeConfigParser
+    from ConfigParser import DuplicateSectionError, MissingSectionHeaderError, NoOptionError, NoSectionError, ParsingError
     from StringIO import StringIO
 
     str = str
@@ -20,12 +26,18 @@ else:
     import urllib.parse as urllib
     from urllib.parse import urljoin, urlparse
     from configparser import ConfigParser, RawConfigParser, SafeConfigParser
+    from configparser import DuplicateSectionError, MissingSectionHeaderError, NoOptionError, NoSectionError, ParsingError
     from io import StringIO
 
     str = str
     unicode = str
     basestring = str
 
+try:
+    from importlib.metadata import entry_points as _entry_points
+except ImportError:
+    from importlib_metadata import entry_points as _entry_points
+
 _warnings_showwarning = None
 
 
@@ -71,28 +83,42 @@ def capture_warnings(capture):
             _warnings_showwarning = None
 
 
-# subprocess.check_output() backport (see https://gist.github.com/edufelipe/1027906)
-def check_output(*popenargs, **kwargs):
-    """Run command with arguments and return its output as a byte string.
-
-    Backported from Python 2.7 as it's implemented as pure python on stdlib.
-
-    check_output(['/usr/bin/python', '--version'])
-    Python 2.6.2
+try:
+    from subprocess import check_output
+except ImportError:
+    # subprocess.check_output() backport (see https://gist.github.com/edufelipe/1027906)
+    def check_output(*popenargs, **kwargs):
+        """Run command with arguments and return its output as a byte string.
+
+        Backported from Python 2.7 as it's implemented as pure python on stdlib.
+
+        check_output(['/usr/bin/python', '--version'])
+        Python 2.6.2
+        """
+        if 'stdout' in kwargs:
+            raise ValueError('stdout argument not allowed, it will be overridden.')
+        process = subprocess.Popen(stdout=subprocess.PIPE, *popenargs, **kwargs)
+        output, unused_err = process.communicate()
+        retcode = process.poll()
+        if retcode:
+            cmd = kwargs.get("args")
+            if cmd is None:
+                cmd = popenargs[0]
+            error = subprocess.CalledProcessError(retcode, cmd)
+            error.output = output
+            raise error
+        return output
+
+
+def entry_points(group):
+    """
+    Returns the entry points registered for a group, allowing for compatibility issues between the dict based API of older
+    importlib.metadata versions and the selectable API of newer versions.
     """
-    if 'stdout' in kwargs:
-        raise ValueError('stdout argument not allowed, it will be overridden.')
-    process = subprocess.Popen(stdout=subprocess.PIPE, *popenargs, **kwargs)
-    output, unused_err = process.communicate()
-    retcode = process.poll()
-    if retcode:
-        cmd = kwargs.get("args")
-        if cmd is None:
-            cmd = popenargs[0]
-        error = subprocess.CalledProcessError(retcode, cmd)
-        error.output = output
-        raise error
-    return output
+    eps = _entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group=group)
+    return eps.get(group, ())
 
 
 def init_git_repo(*args, **kwargs):
@@ -0,0 +1,218 @@
+import re
+from collections import OrderedDict
+
+from aura.compat import basestring, DuplicateSectionError, MissingSectionHeaderError, NoOptionError, NoSectionError, ParsingError
+
+DEFAULT_SECTION = "DEFAULT"
+BOOLEAN_STATES = {'1': True, 'yes': True, 'true': True, 'on': True,
+                  '0': False, 'no': False, 'false': False, 'off': False}
+
+_SECTION_RE = re.compile(r"^\[(?P<name>[^]]+)\]$")
+_OPTION_RE = re.compile(r"^(?P<key>[^=:\s][^=:]*?)\s*[:=]\s*(?P<value>.*)$")
+_UNSET = object()
+
+
+class FastConfigParser(object):
+    """
+    A lightweight replacement for ConfigParser, that only supports the simple INI files used to configure the application.
+
+    Values are stored and returned as is, so unlike ConfigParser no interpolation is performed.
+    """
+    def __init__(self, defaults=None):
+        self._defaults = OrderedDict()
+        self._sections = OrderedDict()
+        if defaults:
+            for key, value in defaults.items():
+                self._defaults[self.optionxform(key)] = value
+
+    def optionxform(self, optionstr):
+        return optionstr.lower()
+
+    def defaults(self):
+        return self._defaults
+
+    def sections(self):
+        return list(self._sections)
+
+    def add_section(self, section):
+        if section == DEFAULT_SECTION:
+            raise ValueError("Invalid section name: %r" % section)
+        if section in self._sections:
+            raise DuplicateSectionError(section)
+        self._sections[section] = OrderedDict()
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def options(self, section):
+        try:
+            options = list(self._sections[section])
+        except KeyError:
+            raise NoSectionError(section)
+        options.extend(key for key in self._defaults if key not in self._sections[section])
+        return options
+
+    def has_option(self, section, option):
+        option = self.optionxform(option)
+        if not section or section == DEFAULT_SECTION:
+            return option in self._defaults
+        elif section not in self._sections:
+            return False
+        else:
+            return option in self._sections[section] or option in self._defaults
+
+    def get(self, section, option, raw=False, vars=None, fallback=_UNSET):
+        option = self.optionxform(option)
+        if vars and option in vars:
+            return vars[option]
+
+        if section != DEFAULT_SECTION and section not in self._sections:
+            if fallback is _UNSET:
+                raise NoSectionError(section)
+            return fallback
+
+        if section != DEFAULT_SECTION and option in self._sections[section]:
+            return self._sections[section][option]
+        elif option in self._defaults:
+            return self._defaults[option]
+        elif fallback is _UNSET:
+            raise NoOptionError(option, section)
+        else:
+            return fallback
+
+    def getint(self, section, option, **kwargs):
+        return int(self.get(section, option, **kwargs))
+
+    def getfloat(self, section, option, **kwargs):
+        return float(self.get(section, option, **kwargs))
+
+    def getboolean(self, section, option, **kwargs):
+        value = self.get(section, option, **kwargs)
+        if isinstance(value, bool):
+            return value
+        elif value.lower() not in BOOLEAN_STATES:
+            raise ValueError("Not a boolean: %s" % value)
+        return BOOLEAN_STATES[value.lower()]
+
+    def items(self, section, raw=False, vars=None):
+        try:
+            options = self._defaults.copy()
+            options.update(self._sections[section])
+        except KeyError:
+            if section != DEFAULT_SECTION:
+                raise NoSectionError(section)
+        if vars:
+            for key, value in vars.items():
+                options[self.optionxform(key)] = value
+        return list(options.items())
+
+    def set(self, section, option, value=None):
+        if not section or section == DEFAULT_SECTION:
+            options = self._defaults
+        else:
+            try:
+                options = self._sections[section]
+            except KeyError:
+                raise NoSectionError(section)
+        options[self.optionxform(option)] = value
+
+    def remove_option(self, section, option):
+        if not section or section == DEFAULT_SECTION:
+            options = self._defaults
+        else:
+            try:
+                options = self._sections[section]
+            except KeyError:
+                raise NoSectionError(section)
+        return options.pop(self.optionxform(option), _UNSET) is not _UNSET
+
+    def update(self, other):
+        """Merges the defaults and sections of another FastConfigParser into this one, overriding any existing values."""
+        self._defaults.update(other._defaults)
+        for section, options in other._sections.items():
+            self._sections.setdefault(section, OrderedDict()).update(options)
+
+    def read(self, filenames):
+        """
+        Read and parse a filename or a list of filenames. Files that cannot be opened are silently ignored.
+
+        :return: The list of successfully read files.
+        """
+        if isinstance(filenames, basestring):
+            filenames = [filenames]
+
+        read_ok = []
+        for filename in filenames:
+            try:
+                with open(filename) as fp:
+                    self._read(fp, filename)
+            except IOError:
+                continue
+            read_ok.append(filename)
+        return read_ok
+
+    def read_file(self, f, source=None):
+        """Read and parse the config from a file like object."""
+        if source is None:
+            source = getattr(f, "name", "<???>")
+        self._read(f, source)
+
+    readfp = read_file
+
+    def write(self, fp):
+        """Write the configuration, in a format that can be read back in, to a file like object."""
+        if self._defaults:
+            self._write_section(fp, DEFAULT_SECTION, self._defaults)
+        for section, options in self._sections.items():
+            self._write_section(fp, section, options)
+
+    def _write_section(self, fp, section, options):
+        fp.write("[%s]\n" % section)
+        for key, value in options.items():
+            if value is not None:
+                key = "%s = %s" % (key, str(value).replace("\n", "\n\t"))
+            fp.write("%s\n" % key)
+        fp.write("\n")
+
+    def _read(self, fp, fpname):
+        cursect = None
+        optname = None
+        errors = None
+        for lineno, line in enumerate(fp, 1):
+            stripped = line.strip()
+
+            # Skip blank lines and comments
+            if not stripped or stripped[0] in "#;":
+                continue
+
+            # Indented lines continue the previous value
+            if line[0].isspace() and optname is not None:
+                cursect[optname] += "\n" + stripped
+                continue
+
+            # Check for a section header
+            section_match = _SECTION_RE.match(stripped)
+            if section_match:
+                name = section_match.group("name")
+                if name == DEFAULT_SECTION:
+                    cursect = self._defaults
+                else:
+                    cursect = self._sections.setdefault(name, OrderedDict())
+                optname = None
+                continue
+            elif cursect is None:
+                raise MissingSectionHeaderError(fpname, lineno, line)
+
+            # Otherwise it should be an option
+            option_match = _OPTION_RE.match(stripped)
+            if option_match:
+                optname = self.optionxform(option_match.group("key").rstrip())
+                cursect[optname] = option_match.group("value")
+            else:
+                if errors is None:
+                    errors = ParsingError(fpname)
+                errors.append(lineno, repr(line))
+                optname = None
+
+        if errors is not None:
+            raise errors
@@ -0,0 +1,13 @@
+# Note: This is kept separate from aura.video, so the choices can be used by the cli without importing PIL and numpy
+
+
+class HWAccel(object):
+    NONE = "none"
+    AUTO = "auto"
+    VAAPI = "vaapi"
+    NVENC = "nvenc"
+    VIDEOTOOLBOX = "videotoolbox"
+
+    # The H.264 encoder to use for each hardware acceleration method
+    ENCODERS = {VAAPI: "h264_vaapi", NVENC: "h264_nvenc", VIDEOTOOLBOX: "h264_videotoolbox"}
+    CHOICES = [NONE, AUTO, VAAPI, NVENC, VIDEOTOOLBOX]
@@ -1,17 +1,22 @@
 import fnmatch
-import inspect
 import logging
 import os
+import re
 import sys
 from collections import OrderedDict
-from pkg_resources import iter_entry_points
 
+from aura.compat import entry_points, scandir
 from aura.exceptions import UnknownSourceFormatException
+from aura.transformers.base import Transformer
 from aura.utils import INIConfigParser
 
 
 log = logging.getLogger("aura.transformers")
 plugin_group_name = "aura.transformers"
+_transformer_class_cache = {}
+_transformers = None
+_plugins = None
+_filetype_pattern_cache = {}
 
 # Setup the supported filetypes for each transformer
 registered_filetypes = OrderedDict()
@@ -19,21 +24,58 @@ registered_filetypes["publican"] = ["publican.cfg"]
 registered_filetypes["asciidoc"] = ["*.adoc", "*.asciidoc"]
 
 
+def get_plugins():
+    """Gets the transformer plugin entry points, keyed by the transformer name. The entry points are only looked up once per process."""
+    global _plugins
+
+    # Cache this as the installed plugins won't change while running and looking up the entry points is slow
+    if _plugins is None:
+        _plugins = dict((plugin.name, plugin) for plugin in entry_points(plugin_group_name))
+    return _plugins
+
+
 def get_transformers():
-    transformers_dir = os.path.dirname(__file__)
+    global _transformers
 
-    transformers = set()
-    for filename in os.listdir(transformers_dir):
-        if filename.endswith('.py') and filename.startswith("tf_"):
-            transformers.add(filename[3:-3])
-    for plugin in iter_entry_points(plugin_group_name):
-        transformers.add(plugin.name)
-    return list(transformers)
+    # Cache this as the built-in transformers and installed plugins won't change while running, and looking up the plugins is slow
+    if _transformers is None:
+        transformers_dir = os.path.dirname(__file__)
+
+        transformers = set()
+        for entry in scandir(transformers_dir):
+            filename = entry.name
+            if filename.endswith('.py') and filename.startswith("tf_") and entry.is_file():
+                transformers.add(filename[3:-3])
+        transformers.update(get_plugins())
+        _transformers = transformers
+
+    return list(_transformers)
 
 
 FORMATS = get_transformers()
 
 
+def refresh_plugins():
+    """
+    Clears the cached plugins and transformers, so that any newly installed/registered plugins are found. FORMATS is updated in place, so
+    any references to it (eg. in click.Choice) see the new transformers.
+    """
+    global _plugins, _transformers
+    _plugins = _transformers = None
+    _transformer_class_cache.clear()
+    FORMATS[:] = get_transformers()
+
+
+def _get_filetype_pattern(filetype):
+    """Gets the compiled regular expression for a filetype glob pattern"""
+    # Cache this, so the pattern isn't looked up/translated by fnmatch for every file that needs to be checked
+    try:
+        return _filetype_pattern_cache[filetype]
+    except KeyError:
+        pattern = _filetype_pattern_cache[filetype] = re.compile(fnmatch.translate(filetype))
+        return pattern
+
+
 def init_transformer(source_markup=None):
     """
     Find and initialize a transformer for the source markup format.
@@ -49,38 +91,58 @@ def init_transformer(source_markup=None):
         else:
             raise UnknownSourceFormatException(source_markup)
     else:
-        # Attempt to find the source format
-        files = os.listdir(os.getcwd())
-        for transformer, filetypes in registered_filetypes.items():
-            for filetype in filetypes:
-                if any(fnmatch.fnmatchcase(filename, filetype) for filename in files):
-                    return import_transformer(transformer)
+        # Attempt to find the source format. The patterns are in priority order, so scan the directory once keeping the highest
+        # priority match, and stop early if a file matches the first pattern
+        patterns = [(transformer, _get_filetype_pattern(filetype))
+                    for transformer, filetypes in registered_filetypes.items() for filetype in filetypes]
+        best_match = len(patterns)
+        for entry in scandir(os.getcwd()):
+            for i in range(best_match):
+                if patterns[i][1].match(entry.name):
+                    best_match = i
+                    break
+            if best_match == 0:
+                break
+
+        if best_match < len(patterns):
+            return import_transformer(patterns[best_match][0])
 
         # Fallback to using the publican transformer
         return import_transformer("publican")
 
 
-def _is_transformer(obj):
-    from aura.transformers.base import Transformer
-    return inspect.isclass(obj) and issubclass(obj, Transformer) and obj != Transformer
+def _find_module_transformer(mod):
+    """Finds the transformer class defined in a transformer module, ignoring any transformers it has imported from other modules"""
+    # Check the module first, as that filters out most of the imported classes without needing to walk their MRO
+    module_name = mod.__name__
+    return min((name, obj) for name, obj in vars(mod).items()
+               if isinstance(obj, type) and obj.__module__ == module_name and obj is not Transformer and issubclass(obj, Transformer))
 
 
-def import_transformer(name):
-    tf_name = tf_class = None
+def _find_transformer_class(name):
     if sys.version_info[0] == 2:
         name = name.encode('ascii', 'replace')
     # Check if the transformer is a plugin
-    for plugin in iter_entry_points(plugin_group_name):
-        if plugin.name == name:
-            tf_class = plugin.load()
-            tf_name = tf_class.__name__
-
-    # Not a plugin, so import the relevant module
-    if tf_class is None:
+    plugin = get_plugins().get(name)
+    if plugin is not None:
+        tf_class = plugin.load()
+        tf_name = tf_class.__name__
+    else:
+        # Not a plugin, so import the relevant module
         import importlib
         mod = importlib.import_module('aura.transformers.tf_' + name)
-        # Inspect the module to find the transformer class to use
-        tf_name, tf_class = inspect.getmembers(mod, _is_transformer)[0]
+        # Find the transformer class to use from the module
+        tf_name, tf_class = _find_module_transformer(mod)
+
+    return tf_name, tf_class
+
+
+def import_transformer(name):
+    # Cache the transformer class, as finding it requires loading the plugin or inspecting the transformer module. Note: A new
+    # instance is still created each time, as transformers hold state about the current build.
+    if name not in _transformer_class_cache:
+        _transformer_class_cache[name] = _find_transformer_class(name)
+    tf_name, tf_class = _transformer_class_cache[name]
 
     # Create the class
     instance = tf_class()
@@ -90,6 +152,11 @@ def import_transformer(name):
 
 class DocsMetadata(object):
     __ERROR_TEMPLATE__ = "Missing %(title)s metadata. Please ensure the %(title)s is defined in %(filepath)s, eg. %(key)s = value"
+    __STR_TEMPLATE__ = "%s\n[metadata]\ntitle = %s\nproduct = %s\nversion = %s\nsubtitle = %s\nedition = %s\n" \
+                       "keywords = %s\nabstract = %s\n\n%s"
+    # The required metadata attributes/keys and their titles, in the order they should be verified
+    __REQUIRED_FIELDS__ = (("title", "title"), ("subtitle", "subtitle"), ("product", "product name"), ("version", "product version"),
+                           ("abstract", "abstract"))
 
     def __init__(self, filepath=None, fd=None):
         self.filepath = filepath
@@ -133,25 +200,10 @@ class DocsMetadata(object):
         :return: True if the required data exists, otherwise false.
         """
         rv = True
-        if not self.title:
-            log.error(self.__ERROR_TEMPLATE__, {"title": "title", "key": "title", "filepath": self.filepath})
-            rv = False
-
-        if not self.subtitle:
-            log.error(self.__ERROR_TEMPLATE__, {"title": "subtitle", "key": "subtitle", "filepath": self.filepath})
-            rv = False
-
-        if not self.product:
-            log.error(self.__ERROR_TEMPLATE__, {"title": "product name", "key": "product", "filepath": self.filepath})
-            rv = False
-
-        if not self.version:
-            log.error(self.__ERROR_TEMPLATE__, {"title": "product version", "key": "version", "filepath": self.filepath})
-            rv = False
-
-        if not self.abstract:
-            log.error(self.__ERROR_TEMPLATE__, {"title": "abstract", "key": "abstract", "filepath": self.filepath})
-            rv = False
+        for attr, title in self.__REQUIRED_FIELDS__:
+            if not getattr(self, attr):
+                log.error(self.__ERROR_TEMPLATE__, {"title": title, "key": attr, "filepath": self.filepath})
+                rv = False
 
         return rv
 
@@ -161,20 +213,13 @@ class DocsMetadata(object):
         else:
             keywords = self.keywords
 
-        return str(self.source) + "\n" + \
-            "[metadata]\n" + \
-            "title = " + (self.title or "") + "\n" + \
-            "product = " + (self.product or "") + "\n" + \
-            "version = " + (self.version or "") + "\n" + \
-            "subtitle = " + (self.subtitle or "") + "\n" + \
-            "edition = " + (self.edition or "") + "\n" + \
-            "keywords = " + (keywords or "") + "\n" + \
-            "abstract = " + (self.abstract or "") + "\n" + \
-            "\n" + \
-            str(self.bugs)
+        return self.__STR_TEMPLATE__ % (self.source, self.title or "", self.product or "", self.version or "", self.subtitle or "",
+                                        self.edition or "", keywords or "", self.abstract or "", self.bugs)
 
 
 class DocsMetadataSource(object):
+    __STR_TEMPLATE__ = "[source]\nlang = %s\ntype = %s\nmainfile = %s\nmarkup = %s\n"
+
     def __init__(self):
         self.lang = "en-US"
         self.type = "Book"
@@ -182,14 +227,12 @@ class DocsMetadataSource(object):
         self.markup = None
 
     def __str__(self):
-        return "[source]\n" + \
-               "lang = " + (self.lang or "") + "\n" + \
-               "type = " + (self.type or "") + "\n" + \
-               "mainfile = " + (self.mainfile or "") + "\n" + \
-               "markup = " + (self.markup or "") + "\n"
+        return self.__STR_TEMPLATE__ % (self.lang or "", self.type or "", self.mainfile or "", self.markup or "")
 
 
 class DocsMetadataBugs(object):
+    __STR_TEMPLATE__ = "[bugs]\nreporting_url = %s\ntype = %s\nproduct = %s\nversion = %s\ncomponent = %s\n"
+
     def __init__(self):
         self.reporting_url = None
         self.type = None
@@ -198,9 +241,5 @@ class DocsMetadataBugs(object):
         self.component = None
 
     def __str__(self):
-        return "[bugs]\n" + \
-               "reporting_url = " + (self.reporting_url or "") + "\n" + \
-               "type = " + (self.type or "") + "\n" + \
-               "product = " + (self.product or "") + "\n" + \
-               "version = " + (self.version or "") + "\n" + \
-               "component = " + (self.component or "") + "\n"
+        return self.__STR_TEMPLATE__ % (self.reporting_url or "", self.type or "", self.product or "", self.version or "",
+                                        self.component or "")
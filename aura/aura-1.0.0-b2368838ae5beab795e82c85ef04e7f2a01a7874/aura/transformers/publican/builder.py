@@ -4,9 +4,10 @@ import time
 from collections import OrderedDict
 
 from lxml import etree, html
+from lxml.html import defs
 
 from aura import utils
-from aura.compat import urlparse
+from aura.compat import urljoin
 from aura.transformers.publican import utils as publican_utils
 from aura.transformers.publican.utils import (XML_FEED_FORMAT, LXML_DOCBOOK_NS, CHUNKING_ELES, DEFAULT_TOC_ELES,
                                               SECTION_ELES, TOC_STANDALONE_ELES)
@@ -15,16 +16,61 @@ from aura.transformers.publican.utils import (XML_FEED_FORMAT, LXML_DOCBOOK_NS,
 PROTOCOL_V1 = 1
 PROTOCOL_V2 = 2
 
+# The maximum number of threads to use when parsing the built html files
+MAX_HTML_PARSER_THREADS = 8
+
+# Precompiled XPath expressions used to find content in the built html
+TITLEPAGE_TITLE_XPATH = etree.XPath(".//*[@class='titlepage']//*[@class='title']")
+TITLE_AND_TOC_DIV_XPATH = etree.XPath(".//*[@class='titlepage']//*[@class='title'] | .//*[local-name()='div'][contains(@class,'toc')]")
+LINK_XPATH = etree.XPath("descendant-or-self::*[@href] | descendant-or-self::img | descendant-or-self::object")
+# The image and object attributes that link to files and need the image path prefixed, matching those returned by lxml's iterlinks()
+IMG_LINK_ATTRS = tuple(sorted(defs.link_attrs - frozenset(["href"])))
+OBJECT_LINK_ATTRS = ("classid", "data", "archive")
+
+# The toc item attributes, depending on if the item is visible or not
+TOC_ITEM_VISIBLE_ATTRS = {
+    True: {"visible": "True"},
+    False: {"visible": "False"}
+}
+
+# The html toc menu item css classes, keyed by if the item is first, last and has children
+TOC_MENU_CSS_CLASSES = {
+    (True, True, True): "first last children",
+    (True, True, False): "first last leaf",
+    (True, False, True): "first children",
+    (True, False, False): "first leaf",
+    (False, True, True): "last children",
+    (False, True, False): "last leaf",
+    (False, False, True): "children",
+    (False, False, False): "leaf"
+}
+
+# The chunkable element names, both with and without the DocBook 5 namespace
+CHUNKING_TAGS = tuple(CHUNKING_ELES) + tuple(LXML_DOCBOOK_NS + tag for tag in CHUNKING_ELES)
+
+# Cache the newline and indentation strings, since one is needed for every element that gets created
+_indent_cache = {}
+
+
+def get_indent(indent):
+    """
+    Gets the newline and pretty print indentation string for an indentation level.
+    """
+    try:
+        return _indent_cache[indent]
+    except KeyError:
+        indent_str = _indent_cache[indent] = "\n" + (indent * "  ")
+        return indent_str
+
 
 def create_element(name, value, attrs=None, indent=1):
     """
     Creates a new XML element with the specified name, value and attributes. An indent value can also be passed to specify the xml elements
     pretty print indentation.
     """
-    attrs = attrs or {}
     ele = etree.Element(name, attrib=attrs)
     ele.text = value
-    ele.tail = "\n" + (indent * "  ")
+    ele.tail = get_indent(indent)
     return ele
 
 
@@ -32,11 +78,14 @@ def add_new_element(parent, name, value, attrs=None, indent=1, index=-1):
     """
     Creates a new element and adds it to the specified parent. If an index isn't passed, then the new element will be appended to the end.
     """
-    ele = create_element(name, value, attrs, indent)
     if index >= 0:
+        ele = create_element(name, value, attrs, indent)
         parent.insert(index, ele)
     else:
-        parent.append(ele)
+        # Create and append the element in one step
+        ele = etree.SubElement(parent, name, attrib=attrs)
+        ele.text = value
+        ele.tail = get_indent(indent)
     return ele
 
 
@@ -54,8 +103,12 @@ def fix_page_link(context, link):
     """
     Fixes an inter page link to use the feeds filename/page slug
     """
-    # Parse the link to get just the filename
-    link_filename = urlparse(link).path
+    # Links to anything other than a html page don't need fixing
+    if ".html" not in link:
+        return link
+
+    # Strip any fragment/query to get just the filename. Inter page links are always relative filenames, so a full url parse isn't needed
+    link_filename = link.split("#", 1)[0].split("?", 1)[0]
     if link_filename in context.src_html_files:
         # Link to another page
         filename = link_filename.replace(".html", "")
@@ -89,6 +142,7 @@ class XMLFeedBuilderContext(object):
     """
     def __init__(self, transformer, doc_uuid, src_tree, src_lang, lang, config, trans_tree=None, protocol=PROTOCOL_V1):
         self.doc_id = transformer.get_doc_id(config, lang)
+        self.image_path_prefix = "/sites/default/files/documentation/" + self.doc_id + "/"
         self.doc_uuid = doc_uuid
         self.src_lang = src_lang
         self.src_html_dir = transformer.get_build_dir(src_lang, XML_FEED_FORMAT, config)
@@ -102,16 +156,18 @@ class XMLFeedBuilderContext(object):
 
         # Init common vars from the config
         self.config = config
+        settings = publican_utils.load_publican_settings(config)
         self.docbook_ver = publican_utils.get_dtdver(config)
-        self.doc_type = publican_utils.get_type(config).lower()
-        self.toc_section_depth = int(publican_utils.get_toc_section_depth(config))
+        self.doc_type = settings.type.lower()
+        self.toc_section_depth = int(settings.toc_section_depth)
 
         # Cache some information we don't want to have to load each time it's needed
         self._cache = {
             "src_xml_dir": transformer.get_build_dir(src_lang, "xml", config),
             "trans_xml_dir": transformer.get_build_dir(lang, "xml", config),
             "src_info_ele": None,
-            "trans_info_ele": None
+            "trans_info_ele": None,
+            "resolved_info_eles": {}
         }
 
     @property
@@ -121,31 +177,42 @@ class XMLFeedBuilderContext(object):
     @property
     def src_html_files(self):
         """
-        Gets a list of source html filenames from the HTML build.
+        Gets the set of source html filenames from the HTML build.
         """
+        # Store this as a set, as it's used to check if every inter page link is to a html file
         if 'src_html_files' not in self._cache:
-            self._cache['src_html_files'] = os.listdir(self.src_html_dir)
+            self._cache['src_html_files'] = frozenset(os.listdir(self.src_html_dir))
         return self._cache['src_html_files']
 
     @property
     def trans_html_files(self):
         """
-        Gets a list of translated html filenames from the HTML build.
+        Gets the set of translated html filenames from the HTML build.
         """
         if 'trans_html_files' not in self._cache:
-            self._cache['trans_html_files'] = os.listdir(self.trans_html_dir)
+            self._cache['trans_html_files'] = frozenset(os.listdir(self.trans_html_dir))
         return self._cache['trans_html_files']
 
     @property
     def used_page_ids(self):
         """
-        :return: A list of page ids that have been used/reserved during the build process
-        :rtype: list[str]
+        :return: A set of page ids that have been used/reserved during the build process
+        :rtype: set[str]
         """
         if 'used_page_ids' not in self._cache:
-            self._cache['used_page_ids'] = []
+            self._cache['used_page_ids'] = set()
         return self._cache['used_page_ids']
 
+    @property
+    def page_id_suffixes(self):
+        """
+        :return: A mapping of the generated base page ids to the last suffix count tried for them
+        :rtype: dict[str, int]
+        """
+        if 'page_id_suffixes' not in self._cache:
+            self._cache['page_id_suffixes'] = {}
+        return self._cache['page_id_suffixes']
+
     def page_url_token(self, filename):
         """
         Generates an XML Feeds url token using the specified filename in this context.
@@ -179,19 +246,21 @@ class XMLFeedBuilderContext(object):
         # Publican is stupid and instead of reading from the XML tree, it reads from the "Book_Info.xml" file, This content might not
         # even be included in the output, but nonetheless that is how publican reads the info content so we have to replicate it here.
         if self.is_translation and use_translation:
-            if self._cache['trans_info_ele'] is None:
-                self._cache['trans_info_ele'] = publican_utils.load_publican_info_xml(self._cache['trans_xml_dir'], self.config)
-            info_ele = self._cache['trans_info_ele']
+            cache_key, xml_dir = 'trans_info_ele', self._cache['trans_xml_dir']
         else:
-            if self._cache['src_info_ele'] is None:
-                self._cache['src_info_ele'] = publican_utils.load_publican_info_xml(self._cache['src_xml_dir'], self.config)
-            info_ele = self._cache['src_info_ele']
+            cache_key, xml_dir = 'src_info_ele', self._cache['src_xml_dir']
 
-        # The root element of the publican info_file might not actually be the "info" element
-        if info_ele.tag.endswith("info"):
-            return info_ele
-        else:
-            return publican_utils.find_info_ele(info_ele)
+        resolved_info_eles = self._cache['resolved_info_eles']
+        if cache_key not in resolved_info_eles:
+            if self._cache[cache_key] is None:
+                self._cache[cache_key] = publican_utils.load_publican_info_xml(xml_dir, self.config)
+            info_ele = self._cache[cache_key]
+
+            # The root element of the publican info_file might not actually be the "info" element
+            if not info_ele.tag.endswith("info"):
+                info_ele = publican_utils.find_info_ele(info_ele)
+            resolved_info_eles[cache_key] = info_ele
+        return resolved_info_eles[cache_key]
 
     def get_info_ele_value(self, info_ele, name, default=None):
         """
@@ -206,6 +275,16 @@ class XMLFeedBuilderContext(object):
             value = utils.find_element_value(info_ele.getparent(), name)
         return default if value is None else value
 
+    def html_file_exists(self, filename, use_translation=True):
+        """
+        Checks if a html file was built, based on if a translation build is being performed or not. This uses the cached directory listing,
+        so no filesystem lookups are required.
+        """
+        if self.is_translation and use_translation:
+            return filename in self.trans_html_files
+        else:
+            return filename in self.src_html_files
+
     def html_file_path(self, filename, use_translation=True):
         """
         Resolve file path to a built html file, based on if a translation build is being performed or not.
@@ -250,11 +329,14 @@ class XMLFeedBuilder(object):
         self.add_lang(doc_ele)
         self.add_type(doc_ele)
 
+        # Find the book info element, so it only has to be looked up once
+        info_ele = self.context.get_info_ele()
+
         # Add a name for legacy purposes
-        self.add_name(doc_ele)
+        self.add_name(doc_ele, info_ele=info_ele)
 
         # Add in the product/version/title/etc... metadata
-        self.add_info_metadata(doc_ele)
+        self.add_info_metadata(doc_ele, info_ele=info_ele)
 
         # Add in the created date
         self.add_created_datetime(doc_ele)
@@ -296,12 +378,15 @@ class XMLFeedBuilder(object):
         # Add the lang after the id
         add_new_element_after_ele(feed_ele, "id", "lang", self.context.lang, lang_attrs, default_index=0)
 
-    def add_name(self, feed_ele):
+    def add_name(self, feed_ele, info_ele=None):
         """
         Adds generated name for the document to the passed feed.
+
+        :param info_ele: The book info element, if it has already been looked up.
         """
         # Find the book info element
-        info_ele = self.context.get_info_ele()
+        if info_ele is None:
+            info_ele = self.context.get_info_ele()
         title, product, version = publican_utils.get_npv_from_xml(info_ele)
         # The title might not have been in the info ele for DocBook 5.0, so handle that
         if title is None:
@@ -342,12 +427,15 @@ class XMLFeedBuilder(object):
 
             add_new_element(feed_ele, feed_name, value, attrs)
 
-    def add_info_metadata(self, feed_ele):
+    def add_info_metadata(self, feed_ele, info_ele=None):
         """
         Adds the info metadata from the source XML (ie title, product, version, etc...) to the passed feed.
+
+        :param info_ele: The book info element, if it has already been looked up.
         """
         # Find the book info element
-        info_ele = self.context.get_info_ele()
+        if info_ele is None:
+            info_ele = self.context.get_info_ele()
 
         # Add the product, version, title and subtitle
         self._add_translateable_info(feed_ele, info_ele)
@@ -415,18 +503,21 @@ class XMLFeedBuilder(object):
         # doing it via a separate transformation it would generate different dynamic node ids.
 
         # Add the toc element to the XML Feed
-        toc_feed_ele = add_new_element(feed_ele, "toc", "\n" + (4 * " "))
+        toc_feed_ele = add_new_element(feed_ele, "toc", get_indent(2))
 
         if self.context.docbook_ver >= (5, 0):
             html_transformer = DocBookHTML5Transformer()
         else:
             html_transformer = DocBookHTML4Transformer()
 
+        # Extract the toc from each paged/chunked html file
+        html_toc_trees = self._extract_html_toc_trees(chunk_map, html_transformer)
+
         # Loop over each paged/chunked html file and generate a toc representation
         complete_toc_tree = []
         for filename, chunk_data in chunk_map.items():
             # Generate the toc xml feed representation for the page
-            toc_tree = self._build_toc_tree(filename, html_transformer, chunk_map=chunk_data.get('children'))
+            toc_tree = self._build_toc_tree(filename, html_toc_trees, chunk_map=chunk_data.get('children'))
 
             # Fix the toc titles, to strip the "Chapter" name and fix the links to use the page slugs
             self._fix_toc_tree_title_and_links(toc_tree)
@@ -439,27 +530,71 @@ class XMLFeedBuilder(object):
             toc_feed_ele.append(toc_item)
 
     def _fix_toc_tree_title_and_links(self, toc_tree):
-        for node in toc_tree:
-            # Strip the name of the block
-            if node.get('type'):
-                node['title'] = publican_utils.strip_block_name_from_title(node['type'], node['title'], self.context.lang)
-            # Fix the link to use the page slugs
-            node['href'] = fix_page_link(self.context, node['href'])
-            # Process any child nodes in the tree
-            if 'children' in node:
-                self._fix_toc_tree_title_and_links(node['children'])
-
-    def _build_toc_tree(self, html_filename, html_transformer, chunk_map=None):
-        html_file = self.context.html_file_path(html_filename + ".html")
-        if not os.path.isfile(html_file):
-            return []
+        lang = self.context.lang
+        pending = [toc_tree]
+        while pending:
+            for node in pending.pop():
+                # Strip the name of the block
+                if node.get('type'):
+                    node['title'] = publican_utils.strip_block_name_from_title(node['type'], node['title'], lang)
+                # Fix the link to use the page slugs
+                node['href'] = fix_page_link(self.context, node['href'])
+                # Process any child nodes in the tree
+                children = node.get('children')
+                if children is not None:
+                    pending.append(children)
+
+    def _extract_html_toc_trees(self, chunk_map, html_transformer):
+        """
+        Parses each built html file in the chunk map and extracts its table of contents. Parsing is the most expensive part of
+        building the toc and lxml releases the GIL while parsing, so the files are processed concurrently. Each file is parsed and
+        read in the same thread, and only the extracted toc data is returned, so no lxml trees are shared between threads.
+
+        :return: A mapping of the html filenames (without the extension) to their extracted toc tree.
+        :rtype: dict
+        """
+        # Find all the html files that were built
+        html_filenames = []
+        pending = [chunk_map]
+        while pending:
+            for filename, chunk_data in pending.pop().items():
+                if self.context.html_file_exists(filename + ".html"):
+                    html_filenames.append(filename)
+                if chunk_data.get('children'):
+                    pending.append(chunk_data['children'])
+
+        toc_elements = self.context.toc_elements
+
+        def extract_toc_tree(filename):
+            # lxml parsers can't be shared between threads, so use a new parser for each file
+            html_ele = utils.parse_xhtml(self.context.html_file_path(filename + ".html"), parser=html.XHTMLParser())
+            # Note: The toc tree only contains plain strings (title, href and type), so it's safe to pass back to the main thread
+            return html_transformer.extract_toc_tree_from_html(html_ele.body, toc_eles=toc_elements)
+
+        if len(html_filenames) > 1:
+            from multiprocessing import cpu_count
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(len(html_filenames), cpu_count(), MAX_HTML_PARSER_THREADS))
+            try:
+                toc_trees = pool.map(extract_toc_tree, html_filenames)
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            toc_trees = [extract_toc_tree(filename) for filename in html_filenames]
 
-        # Parse the html file
-        html_ele = utils.parse_xhtml(html_file)
+        return dict(zip(html_filenames, toc_trees))
+
+    def _build_toc_tree(self, html_filename, html_toc_trees, chunk_map=None):
+        if html_filename not in html_toc_trees:
+            return []
 
-        # Extract the html files table of contents
+        # Get the html files table of contents
         chunk_map = chunk_map or {}
-        toc_tree = html_transformer.extract_toc_tree_from_html(html_ele.body, toc_eles=self.context.toc_elements)
+        toc_tree = html_toc_trees[html_filename]
 
         if len(toc_tree) > 0:
             # Strip any fragments/anchors from the href for the root page entry
@@ -468,20 +603,28 @@ class XMLFeedBuilder(object):
 
             # Add the child pages to the toc
             for filename, chunk_data in chunk_map.items():
-                child_toc_tree = self._build_toc_tree(filename, html_transformer, chunk_data.get('children'))
+                child_toc_tree = self._build_toc_tree(filename, html_toc_trees, chunk_data.get('children'))
 
                 # Make sure we found some toc elements and add the child elements to the last toc tree node
                 if len(child_toc_tree) > 0:
-                    last_tree_node = toc_tree[-1]
-                    if 'children' not in last_tree_node:
-                        last_tree_node['children'] = []
-                    last_tree_node['children'].extend(child_toc_tree)
+                    toc_tree[-1].setdefault('children', []).extend(child_toc_tree)
 
         return toc_tree
 
     def _add_pages_from_chunk_map(self, src_chunking_map, feed_ele, parent_page=None, trans_chunking_map=None):
-        weight = -15
-        for filename, src_chunk_data in src_chunking_map.items():
+        # Walk the chunking map depth first, keeping a stack of the maps being processed so the pages are added in document order.
+        # Each level holds the remaining map items, the parent page, the matching translated map and the next pages weight.
+        stack = [[iter(src_chunking_map.items()), parent_page, trans_chunking_map, -15]]
+        while stack:
+            level = stack[-1]
+            src_items, parent_page, trans_chunking_map, weight = level
+            item = next(src_items, None)
+            if item is None:
+                stack.pop()
+                continue
+            level[3] += 1
+
+            filename, src_chunk_data = item
             child_parent_page = parent_page
             # Look up the matching source chunking data
             if trans_chunking_map is not None:
@@ -489,9 +632,8 @@ class XMLFeedBuilder(object):
             else:
                 trans_chunk_data = {}
 
-            # Generate the file path and if it exists add the page to the feed
-            html_file = self.context.html_file_path(filename + ".html")
-            if os.path.isfile(html_file):
+            # If the html file exists add the page to the feed
+            if self.context.html_file_exists(filename + ".html"):
                 # Get the source chunkable elements
                 src_chunkable_ele = src_chunk_data.get('element')
                 trans_chunkable_ele = trans_chunk_data.get('element')
@@ -502,46 +644,79 @@ class XMLFeedBuilder(object):
                 feed_ele.append(page_ele)
 
             # Add the child pages
-            self._add_pages_from_chunk_map(src_chunk_data.get('children'), feed_ele, child_parent_page, trans_chunk_data.get('children'))
-            weight += 1
+            stack.append([iter(src_chunk_data.get('children').items()), child_parent_page, trans_chunk_data.get('children'), -15])
 
-    def _build_chunked_map(self, src_ele, section_map):
+    def _build_chunked_map(self, root_ele, root_map):
         """
         Builds a mapping of potential chunked elements, using the filename as the key and the matching element as the value.
         """
-        tag = src_ele.tag.replace(LXML_DOCBOOK_NS, "")
-        child_map = section_map
-        if tag in CHUNKING_ELES:
+        doc_type = self.context.doc_type
+        ns_prefix_len = len(LXML_DOCBOOK_NS)
+        legal_notice_maps = []
+        # The map each chunked element was added to, its children map and, for root elements, the map to defer legal notices to
+        chunked_ele_maps = {}
+        # Only built when an element without an id needs a generated filename
+        chunk_index = None
+
+        # Let lxml find the chunkable elements in document order, instead of visiting every element in the tree
+        for src_ele in root_ele.iter(*CHUNKING_TAGS):
+            # Find the map to add the element to, by looking for the closest chunked ancestor element. We need to treat the root element
+            # differently though, as any chunkable elements in book/article "info" should be child pages, but all others should be siblings
+            section_map = root_map
+            legal_notice_map = None
+            child_ele = src_ele
+            while child_ele is not root_ele:
+                parent_ele = child_ele.getparent()
+                if parent_ele in chunked_ele_maps:
+                    parent_section_map, parent_child_map, parent_legal_notice_map = chunked_ele_maps[parent_ele]
+                    if parent_legal_notice_map is None:
+                        section_map = parent_child_map
+                    elif "info" in child_ele.tag:
+                        section_map = parent_child_map
+                        legal_notice_map = parent_legal_notice_map
+                    else:
+                        section_map = parent_section_map
+                    break
+                child_ele = parent_ele
+
+            tag = src_ele.tag
+            if tag.startswith(LXML_DOCBOOK_NS):
+                tag = tag[ns_prefix_len:]
+
             # Determine what the filename for the chunked section would be. If it's the root element, then it'll be index.html,
             # otherwise it'll use the id and lastly it'll use a generated name
             ele_id = publican_utils.get_ele_id(src_ele)
-            if tag == self.context.doc_type:
+            if tag == doc_type:
                 filename = 'index'
             elif ele_id is not None:
                 filename = ele_id
             else:
-                filename = publican_utils.get_chunk_filename(src_ele)
+                if chunk_index is None:
+                    chunk_index = publican_utils.build_chunk_index(root_ele)
+                filename = publican_utils.get_chunk_filename(src_ele, chunk_index)
             child_map = OrderedDict()
-            section_map[filename] = {
+            chunk_data = {
                 'element': src_ele,
                 'children': child_map
             }
 
-        for child_ele in src_ele.iterchildren(tag=etree.Element):
-            # Add any child chunkable elements to the map. We need to treat the root element differently though, as any chunkable elements
-            # in book/article "info" should be child pages, but all others should be siblings
-            if tag == self.context.doc_type and "info" not in child_ele.tag:
-                self._build_chunked_map(child_ele, section_map)
+            # Legal notices of the first page need to be moved to the end of the document as required by CCS, so hold them back
+            # until the rest of the document has been added
+            if legal_notice_map is not None and tag == "legalnotice":
+                legal_notice_map[filename] = chunk_data
+            else:
+                section_map[filename] = chunk_data
+
+            if tag == doc_type:
+                root_legal_notice_map = OrderedDict()
+                legal_notice_maps.append((section_map, root_legal_notice_map))
+                chunked_ele_maps[src_ele] = (section_map, child_map, root_legal_notice_map)
             else:
-                self._build_chunked_map(child_ele, child_map)
+                chunked_ele_maps[src_ele] = (section_map, child_map, None)
 
-        # Move any child legal notices of the first page, to the end of the document as required by CCS
-        if tag == self.context.doc_type:
-            first_page_children = section_map['index']['children']
-            for filename, child_map in first_page_children.items():
-                if child_map.get("element").tag.endswith("legalnotice"):
-                    section_map[filename] = child_map
-                    del first_page_children[filename]
+        # Add the deferred legal notices to the end of the document
+        for section_map, root_legal_notice_map in reversed(legal_notice_maps):
+            section_map.update(root_legal_notice_map)
 
 
 class XMLFeedPageBuilder(object):
@@ -580,7 +755,7 @@ class XMLFeedPageBuilder(object):
         :return:
         """
         page_ele = create_element("page", None)
-        page_ele.text = "\n" + (4 * " ")
+        page_ele.text = get_indent(2)
 
         # Add the id/parent/weight
         self.add_page_id(page_ele)
@@ -602,11 +777,14 @@ class XMLFeedPageBuilder(object):
 
         return page_ele
 
-    def _get_src_id(self, src_ele, ignore_generated_ids=True):
+    def _get_src_id(self, src_ele, ignore_generated_ids=True, title_ele=None):
         """
         Look up the source XML id, which could be located on the passed element or the child title element.
+
+        :param title_ele: The child title element of src_ele, if it has already been looked up.
         """
-        title_ele = publican_utils.find_ele(src_ele, "title")
+        if title_ele is None:
+            title_ele = publican_utils.find_ele(src_ele, "title")
         for ele in [src_ele, title_ele]:
             if ele is not None:
                 ele_id = publican_utils.get_ele_id(ele)
@@ -624,17 +802,22 @@ class XMLFeedPageBuilder(object):
         Looks up a page id from the source XML element and adds it to the passed page. If an id wasn't specified then one is generated by
         using the source XML elements title.
         """
-        if self.src_chunkable_ele.tag.endswith(self.context.doc_type):
-            page_id = self.context.doc_id
+        # Strip the DocBook namespace, so the tag can be compared directly
+        src_tag = self.src_chunkable_ele.tag
+        if src_tag.startswith(LXML_DOCBOOK_NS):
+            src_tag = src_tag[len(LXML_DOCBOOK_NS):]
+
+        if src_tag == self.context.doc_type:
+            page_id = self.context.doc_id.lower()
         else:
-            page_id = self._get_src_id(self.src_chunkable_ele)
+            title_ele = publican_utils.find_ele(self.src_chunkable_ele, "title")
+            page_id = self._get_src_id(self.src_chunkable_ele, title_ele=title_ele)
 
             # Check we got a page id, if not generate one
             if page_id is None:
-                title_ele = publican_utils.find_ele(self.src_chunkable_ele, "title")
                 # Use the filename if no title was found or the element is a Preface or Legal Notice. Otherwise generate an id using the
                 # title and generate a warning
-                if self.src_chunkable_ele.tag.endswith("preface") or self.src_chunkable_ele.tag.endswith("legalnotice"):
+                if src_tag == "preface" or src_tag == "legalnotice":
                     title = self.filename
                 elif title_ele is not None:
                     title = utils.get_element_text(title_ele).strip()
@@ -645,26 +828,30 @@ class XMLFeedPageBuilder(object):
                     title = self.filename
 
                 # Get the id to use by checking if an auto generated id exists or if one doesn't then generate one from the title.
-                generated_page_id = self._get_src_id(self.src_chunkable_ele, ignore_generated_ids=False)
+                generated_page_id = self._get_src_id(self.src_chunkable_ele, ignore_generated_ids=False, title_ele=title_ele)
                 if generated_page_id:
                     page_id = generated_page_id
                 else:
-                    # Generate the page id from the title and then add a count after the id if it's not unique
+                    # Generate the page id from the title and then add a count after the id if it's not unique. The count starts from
+                    # the last one tried for the title, so earlier duplicates don't have to be checked again
                     base_page_id = page_id = utils.create_xml_id(title).lower()
-                    count = 1
+                    count = self.context.page_id_suffixes.get(base_page_id, 1)
+                    if count > 1:
+                        page_id = base_page_id + "_" + str(count)
                     while page_id in self.context.used_page_ids:
                         count += 1
                         page_id = base_page_id + "_" + str(count)
+                    self.context.page_id_suffixes[base_page_id] = count
 
             # Cache the page id in the build context, so we know not to use it again
             page_id = page_id.lower()
-            self.context.used_page_ids.append(page_id)
+            self.context.used_page_ids.add(page_id)
 
             # Prepend the doc id to the page id
-            page_id = self.context.doc_id + "-" + page_id
+            page_id = self.context.doc_id.lower() + "-" + page_id
 
         # Create the ele and add it to the page
-        add_new_element(page_ele, "id", page_id.lower(), indent=self.indent)
+        add_new_element(page_ele, "id", page_id, indent=self.indent)
 
     def add_page_url_slug(self, page_ele):
         """
@@ -716,28 +903,55 @@ class XMLFeedPageBuilder(object):
         Cleans a passed HTML body element to remove the initial heading (since Drupal adds this) and also to update links between pages to
         use the generated url token. Lastly images are updated to have the drupal path prefixed to the image path.
         """
+        # Find the title header and any table of contents in one pass. A toc div never has a class of just "title", so the first
+        # element with that class is the title header.
+        title = None
+        tocs = []
+        for ele in TITLE_AND_TOC_DIV_XPATH(body_ele):
+            if title is None and ele.get("class") == "title":
+                title = ele
+            elif ele.get("class") != "title":
+                tocs.append(ele)
+
         # Remove the title header as it's displayed by drupal
-        title = body_ele.find(".//*[@class='titlepage']//*[@class='title']")
         if title is not None:
-            # Find the top level parent element of the title and remove it
-            while len(title.getparent()) == 1:
-                title = title.getparent()
-            title.getparent().remove(title)
-
-        # Remove any table of contents
-        tocs = body_ele.xpath(".//*[local-name()='div'][contains(@class,'toc')]")
-        if len(tocs) > 0:
-            for toc in tocs:
-                toc.getparent().remove(toc)
+            # Find the top level parent element of the title and remove it. An element is an only child if it has no siblings, which is
+            # cheaper to check than counting the parents children.
+            parent = title.getparent()
+            while title.getprevious() is None and title.getnext() is None:
+                title = parent
+                parent = title.getparent()
+            parent.remove(title)
+
+        # Remove any table of contents, skipping any that were already removed along with the title
+        for toc in tocs:
+            parent = toc.getparent()
+            if parent is not None:
+                parent.remove(toc)
 
         # Replace links to other pages and image paths
-        for element, attribute, link, pos in body_ele.iterlinks():
-            if attribute == "href":
-                fixed_link = fix_page_link(self.context, link)
-                element.set(attribute, fixed_link)
-            elif element.tag in ['img', 'object']:
-                # Image link
-                element.set(attribute, "/sites/default/files/documentation/" + self.context.doc_id + "/" + link)
+        image_path_prefix = self.context.image_path_prefix
+        for element in LINK_XPATH(body_ele):
+            link = element.get("href")
+            if link is not None:
+                element.set("href", fix_page_link(self.context, link))
+
+            if element.tag == "img":
+                for attribute in IMG_LINK_ATTRS:
+                    link = element.get(attribute)
+                    if link is not None:
+                        element.set(attribute, image_path_prefix + link)
+            elif element.tag == "object":
+                # Any object links are relative to the codebase, if one is set
+                codebase = element.get("codebase")
+                if codebase is not None:
+                    element.set("codebase", image_path_prefix + codebase)
+                for attribute in OBJECT_LINK_ATTRS:
+                    link = element.get(attribute)
+                    if link is not None:
+                        if codebase is not None:
+                            link = urljoin(codebase, link)
+                        element.set(attribute, image_path_prefix + link)
 
     def add_html_data(self, page_ele):
         """
@@ -768,8 +982,7 @@ class XMLFeedPageBuilder(object):
 
         # Add the body
         body_ele = add_new_element(page_ele, "body", None)
-        for child_ele in body.iterchildren():
-            body_ele.append(child_ele)
+        body_ele.extend(list(body))
 
 
 class DocBookHTMLTransformer(object):
@@ -828,10 +1041,16 @@ class DocBookHTMLTransformer(object):
         """
         Look up the DocBook element id, which could be located on the passed element or the child title element.
         """
-        title_ele = html_ele.find(".//*[@class='titlepage']//*[@class='title']")
-        for ele in [html_ele, title_ele, html_ele.find("./a")]:
+        # Check the element itself first, so the title only has to be searched for when it doesn't have an id
+        ele_id = html_ele.get("id")
+        if ele_id is not None:
+            return ele_id
+
+        title_eles = TITLEPAGE_TITLE_XPATH(html_ele)
+        title_ele = title_eles[0] if len(title_eles) > 0 else None
+        for ele in [title_ele, html_ele.find("./a")]:
             if ele is not None:
-                ele_id = ele.attrib.get("id")
+                ele_id = ele.get("id")
                 if ele_id is not None:
                     return ele_id
 
@@ -849,6 +1068,15 @@ class DocBookHTMLTransformer(object):
     def _extract_toc_children(self, parent_ele):
         raise NotImplementedError()
 
+    def _find_toc_anchor(self, toc_item_ele):
+        """
+        Finds the first "./span/a" anchor of a toc item, by iterating over the children directly instead of evaluating the path.
+        """
+        for span_ele in toc_item_ele.iterchildren("span"):
+            for anchor in span_ele.iterchildren("a"):
+                return anchor
+        return None
+
     def _get_html_ele_link(self, html_ele):
         page_filename = html_ele.base_url.rsplit("/", 1)[1]
         # Determine the elements href
@@ -858,16 +1086,24 @@ class DocBookHTMLTransformer(object):
         else:
             return page_filename
 
+    def _find_html_ele_title(self, html_ele):
+        # Look for the first heading in the elements titlepage
+        for child_ele in html_ele.iterchildren(tag=etree.Element):
+            if child_ele.get("class") == "titlepage":
+                for ele in child_ele.iterdescendants(tag=etree.Element):
+                    if ele.get("class") == "title" and etree.QName(ele).localname.startswith("h"):
+                        return ele
+
+        # Some times the title isn't wrapped in a "titlepage" (ie legalnotice), so look for just a normal heading
+        for ele in html_ele.iterchildren("h1", "h2", "h3", "h4", "h5", "h6"):
+            return ele
+
+        return None
+
     def _get_html_ele_title(self, html_ele):
-        # Determine the elements title
-        title_eles = html_ele.xpath("./*[@class='titlepage']//*[starts-with(local-name(), 'h') and @class='title']")
-        if len(title_eles) == 0:
-            # Some times the title isn't wrapped in a "titlepage" (ie legalnotice), so look for just a normal heading
-            title_eles = html_ele.xpath("./*[self::h1 or self::h2 or self::h3 or self::h4 or self::h5 or self::h6]")
-
-        if len(title_eles) > 0:
-            title_ele = title_eles[0]
-        else:
+        # Determine the elements title, stopping at the first match
+        title_ele = self._find_html_ele_title(html_ele)
+        if title_ele is None:
             # Fallback to the html page title, as a last resort
             title_ele = html_ele.head.find("title")
 
@@ -875,38 +1111,46 @@ class DocBookHTMLTransformer(object):
 
     def extract_toc_tree_from_html(self, html_ele, toc_eles=DEFAULT_TOC_ELES):
         retvalue = []
+        toc_types = frozenset(toc_eles)
+        parent_nodes = []
 
-        for child_ele in html_ele.iterchildren():
-            tag = child_ele.tag
-            classes = child_ele.attrib.get("class", "").split()
+        # Walk the html depth first, using a stack of the elements to process and the list to add any found nodes to. The children are
+        # pushed in reverse, so elements are processed in document order and the nodes are added to each list in order.
+        stack = [(child_ele, retvalue) for child_ele in reversed(html_ele)]
+        while stack:
+            child_ele, nodes = stack.pop()
 
             # Ignore non html elements
             if not isinstance(child_ele, html.HtmlElement):
                 continue
+
+            classes = child_ele.get("class", "").split()
             # Ignore any HTML generated toc content
-            elif "toc" in classes:
+            if "toc" in classes:
                 continue
 
-            matched_toc_types = list(set(classes).intersection(set(toc_eles)))
-            if tag in self.block_html_tags and len(matched_toc_types) >= 1:
-                ele_type = matched_toc_types[0]
+            ele_type = next((css_class for css_class in classes if css_class in toc_types), None)
+            if ele_type is not None and child_ele.tag in self.block_html_tags:
                 # Add the elements details to the tree
                 node = {
                     'title': self._get_html_ele_title(child_ele),
                     'href': self._get_html_ele_link(child_ele),
                     'type': ele_type
                 }
+                nodes.append(node)
 
                 # Look for any child nodes, if we aren't in a standalone element
                 if ele_type not in TOC_STANDALONE_ELES:
-                    child_nodes = self.extract_toc_tree_from_html(child_ele, toc_eles)
-                    if len(child_nodes) > 0:
-                        node['children'] = child_nodes
-
-                # Add the node to the return list
-                retvalue.append(node)
+                    child_nodes = []
+                    parent_nodes.append((node, child_nodes))
+                    stack.extend((ele, child_nodes) for ele in reversed(child_ele))
             else:
-                retvalue.extend(self.extract_toc_tree_from_html(child_ele, toc_eles))
+                stack.extend((ele, nodes) for ele in reversed(child_ele))
+
+        # Only add the child nodes that were found
+        for node, child_nodes in parent_nodes:
+            if len(child_nodes) > 0:
+                node['children'] = child_nodes
 
         return retvalue
 
@@ -923,40 +1167,23 @@ class DocBookHTMLTransformer(object):
         menu_ele = etree.Element('ol', {'class': 'menu'})
 
         # iterate over the top nodes and add them
+        last_count = len(toc_tree) - 1
         for count, node in enumerate(toc_tree):
-            title = node['title']
-            href = node['href']
-
-            # Build up the css class attribute
-            if count == 0 and count == len(toc_tree) - 1:
-                css_classes = ['first', 'last']
-            elif count == 0:
-                css_classes = ['first']
-            elif count == len(toc_tree) - 1:
-                css_classes = ['last']
-            else:
-                css_classes = []
-
-            if 'children' in node:
-                css_classes.append('children')
-            else:
-                css_classes.append('leaf')
+            children = node.get('children')
 
-            # Create the menu element
-            sub_menu_ele = etree.Element('li', {'class': " ".join(css_classes)})
+            # Create the menu element, with the css classes for its position and if it has children
+            css_classes = TOC_MENU_CSS_CLASSES[(count == 0, count == last_count, children is not None)]
+            sub_menu_ele = etree.SubElement(menu_ele, 'li', {'class': css_classes})
 
             # Set the title and href
-            anchor = etree.SubElement(sub_menu_ele, 'a', href=href)
-            anchor.text = title
+            anchor = etree.SubElement(sub_menu_ele, 'a', href=node['href'])
+            anchor.text = node['title']
 
             # Build up the children leaf
-            if 'children' in node:
-                child_menu = self.transform_tree_to_html(node['children'])
+            if children is not None:
+                child_menu = self.transform_tree_to_html(children)
                 sub_menu_ele.append(child_menu)
 
-            # Add the new node
-            menu_ele.append(sub_menu_ele)
-
         return menu_ele
 
     def transform_tree_to_xml(self, toc_tree, indent=1, section_depth=0, max_section_depth=2):
@@ -972,71 +1199,65 @@ class DocBookHTMLTransformer(object):
         :rtype: etree.ElementBase
         """
         max_section_depth = 2 if max_section_depth is None else max_section_depth
-        item_indent = indent + 1
 
         # Create the root element
-        children_ele = create_element('children', "\n" + ((2 * item_indent) * " "), indent=indent-1)
-
-        # iterate over the top nodes and add them
-        for count, node in enumerate(toc_tree):
-            title = node['title']
-            href = node['href']
-            node_type = node.get('type')
-            anchor_url = urlparse(href)
-            page_slug = anchor_url.path
-            anchor = anchor_url.fragment
-
-            # If we are dealing with a section node, increase the section depth count
-            if node_type in SECTION_ELES:
-                current_section_depth = section_depth + 1
-            else:
-                current_section_depth = section_depth
+        root_children_ele = create_element('children', get_indent(indent + 1), indent=indent-1)
 
-            # Create the toc item element
+        # Build up each level of the tree, using a stack of the nodes to add, the element to add them to, the indent and section depth
+        stack = [(toc_tree, root_children_ele, indent, section_depth)]
+        while stack:
+            nodes, children_ele, indent, section_depth = stack.pop()
+            item_indent = indent + 1
             sub_item_indent = indent + 2
-            item_attrs = {
-                "visible": str(current_section_depth <= max_section_depth)
-            }
-            if count == len(toc_tree) - 1:
-                sub_menu_ele = add_new_element(children_ele, 'item', children_ele.text + (2 * " "), attrs=item_attrs, indent=indent)
-            else:
-                sub_menu_ele = add_new_element(children_ele, 'item', children_ele.text + (2 * " "), attrs=item_attrs, indent=item_indent)
-
-            # Set the item elements
-            add_new_element(sub_menu_ele, 'title', title, indent=sub_item_indent)
-            add_new_element(sub_menu_ele, 'page_slug', page_slug, indent=sub_item_indent)
-
-            # Build up the toc children
-            if 'children' in node:
-                add_new_element(sub_menu_ele, 'anchor', anchor, indent=sub_item_indent)
-                child_items = self.transform_tree_to_xml(node['children'],
-                                                         indent=sub_item_indent,
-                                                         section_depth=current_section_depth,
-                                                         max_section_depth=max_section_depth)
-                sub_menu_ele.append(child_items)
-            else:
-                add_new_element(sub_menu_ele, 'anchor', anchor, indent=item_indent)
+            last_count = len(nodes) - 1
 
-            # Add the new node
-            children_ele.append(sub_menu_ele)
+            # iterate over the nodes and add them
+            for count, node in enumerate(nodes):
+                # Split the anchor from the link. The links are always relative page links, so a full url parse isn't needed
+                page_slug, _, anchor = node['href'].partition("#")
 
-        return children_ele
+                # If we are dealing with a section node, increase the section depth count
+                if node.get('type') in SECTION_ELES:
+                    current_section_depth = section_depth + 1
+                else:
+                    current_section_depth = section_depth
+
+                # Create the toc item element
+                item_attrs = TOC_ITEM_VISIBLE_ATTRS[current_section_depth <= max_section_depth]
+                item_tail_indent = indent if count == last_count else item_indent
+                sub_menu_ele = add_new_element(children_ele, 'item', get_indent(sub_item_indent), attrs=item_attrs, indent=item_tail_indent)
+
+                # Set the item elements
+                add_new_element(sub_menu_ele, 'title', node['title'], indent=sub_item_indent)
+                add_new_element(sub_menu_ele, 'page_slug', page_slug, indent=sub_item_indent)
+
+                # Build up the toc children
+                children = node.get('children')
+                if children is not None:
+                    add_new_element(sub_menu_ele, 'anchor', anchor, indent=sub_item_indent)
+                    child_children_ele = create_element('children', get_indent(sub_item_indent + 1), indent=sub_item_indent-1)
+                    sub_menu_ele.append(child_children_ele)
+                    stack.append((children, child_children_ele, sub_item_indent, current_section_depth))
+                else:
+                    add_new_element(sub_menu_ele, 'anchor', anchor, indent=item_indent)
+
+        return root_children_ele
 
 
 class DocBookHTML4Transformer(DocBookHTMLTransformer):
     def _get_root_toc_ele(self, toc_container_ele):
-        return toc_container_ele.find('dl')
+        return next(toc_container_ele.iterchildren('dl'), None)
 
     def _extract_toc_children(self, parent_ele):
         retvalue = []
 
         # Loop over each child and build the tree
         # child_ele will either be dd, or dt
-        for child_ele in parent_ele.iterchildren():
+        for child_ele in parent_ele.iterchildren('dt', 'dd'):
             if child_ele.tag == 'dt':
                 node = {}
                 # Get the anchor
-                anchor = child_ele.find('./span/a')
+                anchor = self._find_toc_anchor(child_ele)
 
                 # Add the anchor details to the tree
                 node['title'] = utils.get_element_text(anchor)
@@ -1046,9 +1267,8 @@ class DocBookHTML4Transformer(DocBookHTMLTransformer):
                 retvalue.append(node)
             elif child_ele.tag == 'dd':
                 # dd should follow a dt element, so use the last element in retvalue
-                node = retvalue[-1]
-                dl_ele = child_ele.find('dl')
-                node['children'] = self._extract_toc_children(dl_ele)
+                dl_ele = next(child_ele.iterchildren('dl'), None)
+                retvalue[-1]['children'] = self._extract_toc_children(dl_ele)
 
         return retvalue
 
@@ -1057,7 +1277,7 @@ class DocBookHTML5Transformer(DocBookHTMLTransformer):
     block_html_tags = ["section", "div"]
 
     def _get_root_toc_ele(self, toc_container_ele):
-        return toc_container_ele.find('ul')
+        return next(toc_container_ele.iterchildren('ul'), None)
 
     def _extract_toc_children(self, parent_ele):
         retvalue = []
@@ -1068,14 +1288,14 @@ class DocBookHTML5Transformer(DocBookHTMLTransformer):
             if child_ele.tag == 'li':
                 node = {}
                 # Get the anchor
-                anchor = child_ele.find('./span/a')
+                anchor = self._find_toc_anchor(child_ele)
 
                 # Add the anchor details to the tree
                 node['title'] = utils.get_element_text(anchor)
                 node['href'] = anchor.get('href')
 
                 # Find the child_ele has a <ul> component, it has children
-                ul_ele = child_ele.find('./ul')
+                ul_ele = next(child_ele.iterchildren('ul'), None)
                 if ul_ele is not None:
                     node['children'] = self._extract_toc_children(ul_ele)
 
@@ -1,5 +1,6 @@
 import os
 import re
+from collections import namedtuple
 
 from lxml import etree
 
@@ -8,6 +9,8 @@ from aura.compat import SafeConfigParser, StringIO, basestring, unicode
 
 
 CONFIG_CACHE = {}
+_l10n_cache = {}
+_title_template_cache = {}
 DOCBOOK_XSL_URI = "http://docbook.sourceforge.net/release/xsl/current"
 XML_FEED_FORMAT = "drupal-book"
 LXML_XML_NS = "{http://www.w3.org/XML/1998/namespace}"
@@ -36,7 +39,7 @@ CHUNKING_ELES = {
     'sect5': {'format': 's{0:02d}', 'use_parent': True},
     'legalnotice': {'format': 'ln{0:02d}', 'any_level': True}
 }
-SECTION_ELES = [
+SECTION_ELES = frozenset([
     'section',
     'sect1',
     'sect2',
@@ -45,16 +48,26 @@ SECTION_ELES = [
     'sect5',
     'topic',
     'simplesect'
-]
-DEFAULT_TOC_ELES = CHUNKING_ELES.keys()
-TOC_STANDALONE_ELES = [
+])
+DEFAULT_TOC_ELES = frozenset(CHUNKING_ELES)
+TOC_STANDALONE_ELES = frozenset([
     'bibliography',
     'glossary',
     'index',
     'legalnotice',
     'refentry',
     'reference'
-]
+])
+# Compile this once, so the keywords can be found in a single call instead of a find and findall for every info element
+KEYWORDS_XPATH = etree.XPath("keywordset[1]/keyword")
+# Compile these once, as they are used to number every chunked element. The tag is passed in as the $tag variable.
+PRECEDING_SIBLING_COUNT_XPATH = etree.XPath("count(preceding-sibling::*[local-name()=$tag])")
+PRECEDING_COUNT_XPATH = etree.XPath("count(../preceding::*[local-name()=$tag])")
+WHITESPACE_RE = re.compile(r'\s')
+# Compile this once, and match the whole class name so that classes like "legalnotice-title-extra" don't match
+LEGALNOTICE_TITLE_XPATH = etree.XPath(".//*[contains(concat(' ', normalize-space(@class), ' '), ' legalnotice-title ')]")
+
+PublicanSettings = namedtuple("PublicanSettings", ["dtdver", "xml_lang", "type", "brand", "chunk_section_depth", "toc_section_depth"])
 
 
 def get_config_val(config, option, section='publican', default=None):
@@ -69,7 +82,11 @@ def get_config_val(config, option, section='publican', default=None):
     """
 
     if config.has_option(section, option):
-        return config.get(section, option).lstrip('"').rstrip('"')
+        value = config.get(section, option)
+        # Most values aren't quoted, so only strip when needed
+        if value[:1] == '"' or value[-1:] == '"':
+            value = value.strip('"')
+        return value
     else:
         return default
 
@@ -82,14 +99,32 @@ def load_publican_config(config_file, cfg_dir=None):
     :param cfg_dir:
     :return:
     """
+    return _load_cached_publican_config(config_file, cfg_dir)[1]
+
+
+def _load_cached_publican_config(config_file, cfg_dir=None):
+    """
+    Loads the cache entry for a publican configuration, parsing the file if it hasn't been cached or has changed since.
+
+    :return: The cache entry, as a list of the file modification time and size, the parsed config and the settings loaded by
+             load_publican_settings() (or None if they haven't been loaded yet).
+    """
     # Resolve the config file path
     cfg_dir = cfg_dir or os.getcwd()
     config_file = config_file if config_file is not None else os.path.join(cfg_dir, "publican.cfg")
 
-    # Load the config file if it hasn't been cached
-    if config_file not in CONFIG_CACHE:
+    # Cache this as the config is loaded for every setting that's looked up, but check the modification time and size so that the file is
+    # parsed again if it has changed
+    try:
+        stat = os.stat(config_file)
+    except OSError as e:
+        # Python 2 raises an OSError, but callers expect the IOError open() would raise
+        raise IOError(e.errno, e.strerror, config_file)
+    file_key = (stat.st_mtime, stat.st_size)
+    cached = CONFIG_CACHE.get(config_file)
+    if cached is None or cached[0] != file_key:
         # Parse the configuration file first to get any overrides
-        with (open(config_file, "r")) as fp:
+        with open(config_file, "r") as fp:
             publican_config = SafeConfigParser(defaults={
                 'xml_lang': 'en-US',
                 'type': 'Book',
@@ -101,10 +136,10 @@ def load_publican_config(config_file, cfg_dir=None):
             })
             publican_config.readfp(StringIO("[publican]\n" + fp.read()))
 
-        # Add the config file to the cache
-        CONFIG_CACHE[config_file] = publican_config
+        # Add the config file to the cache. The settings are stored with the parsed config, so they are replaced together
+        cached = CONFIG_CACHE[config_file] = [file_key, publican_config, None]
 
-    return CONFIG_CACHE[config_file]
+    return cached
 
 
 def load_publican_info_xml(book_lang_dir, publican_cfg=None):
@@ -225,6 +260,31 @@ def _parse_docbook_ver(docbook_ver):
     return major_version, minor_version
 
 
+def load_publican_settings(publican_cfg):
+    """
+    Loads the common settings from the publican configuration, so they only have to be looked up once.
+
+    :param publican_cfg: The path to the publican configuration file
+    :type publican_cfg: str
+    :return: The settings, using the defaults for any settings that aren't set. Note: The dtdver is the unparsed string, so that an
+             invalid version only raises an error when it's used (see get_dtdver()).
+    :rtype: PublicanSettings
+    """
+    # Cache this with the parsed config, so the settings are looked up again if the config file changes
+    cached = _load_cached_publican_config(publican_cfg)
+    if cached[2] is None:
+        publican_config = cached[1]
+        cached[2] = PublicanSettings(
+            dtdver=get_config_val(publican_config, 'dtdver'),
+            xml_lang=get_config_val(publican_config, 'xml_lang'),
+            type=get_config_val(publican_config, 'type'),
+            brand=get_config_val(publican_config, 'brand'),
+            chunk_section_depth=get_config_val(publican_config, 'chunk_section_depth'),
+            toc_section_depth=get_config_val(publican_config, 'toc_section_depth')
+        )
+    return cached[2]
+
+
 def get_dtdver(publican_cfg):
     """
     Gets the `dtdver` setting from the publican configuration, defaulting to 4.5 if nothing is set.
@@ -234,10 +294,7 @@ def get_dtdver(publican_cfg):
     :return: The DTD version of the source content
     :rtype: (int, int)
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    dtdver = get_config_val(publican_config, 'dtdver')
-    return _parse_docbook_ver(dtdver)
+    return _parse_docbook_ver(load_publican_settings(publican_cfg).dtdver)
 
 
 def get_xml_lang(publican_cfg):
@@ -249,9 +306,7 @@ def get_xml_lang(publican_cfg):
     :return: The source xml language of the source content
     :rtype: str
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    return get_config_val(publican_config, 'xml_lang')
+    return load_publican_settings(publican_cfg).xml_lang
 
 
 def get_type(publican_cfg):
@@ -263,9 +318,7 @@ def get_type(publican_cfg):
     :return: The type of document
     :rtype: str
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    return get_config_val(publican_config, 'type')
+    return load_publican_settings(publican_cfg).type
 
 
 def get_brand(publican_cfg):
@@ -277,9 +330,7 @@ def get_brand(publican_cfg):
     :return: The brand to use when transforming the source content
     :rtype: str
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    return get_config_val(publican_config, 'brand')
+    return load_publican_settings(publican_cfg).brand
 
 
 def get_chunk_section_depth(publican_cfg):
@@ -291,9 +342,7 @@ def get_chunk_section_depth(publican_cfg):
     :return: The chunk_section_depth to use when transforming the source content
     :rtype: str
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    return get_config_val(publican_config, 'chunk_section_depth')
+    return load_publican_settings(publican_cfg).chunk_section_depth
 
 
 def get_toc_section_depth(publican_cfg):
@@ -305,9 +354,7 @@ def get_toc_section_depth(publican_cfg):
     :return: The toc_section_depth to use when generating the toc for the source content
     :rtype: str
     """
-    # Parse the configuration file first to get any overrides
-    publican_config = load_publican_config(publican_cfg)
-    return get_config_val(publican_config, 'toc_section_depth')
+    return load_publican_settings(publican_cfg).toc_section_depth
 
 
 def get_docname(publican_cfg):
@@ -330,7 +377,7 @@ def get_docname(publican_cfg):
         book_dir = os.path.dirname(publican_cfg)
         docname, product, version, lang = get_npv_and_lang_from_dir(book_dir, publican_cfg)
     if docname:
-        return re.sub(r'\s', "_", docname)
+        return WHITESPACE_RE.sub("_", docname)
     else:
         return None
 
@@ -360,24 +407,75 @@ def get_mainfile(publican_cfg):
         return None
 
 
-def get_chunk_filename(ele):
+def build_chunk_index(root_ele):
+    """
+    Builds an index of the numbers used to generate the chunked filenames for every chunkable element in a document. This walks the
+    document once, instead of counting the preceding elements for every chunkable element.
+
+    :param root_ele: An element in the document to build the index for.
+    :type root_ele: etree._Element
+    :return: A dict mapping each chunkable element to a tuple of its position amongst its siblings of the same type and the number of
+             elements of the same type that precede its parent.
+    :rtype: dict
+    """
+    root_ele = root_ele.getroottree().getroot()
+    chunk_index = {}
+    # The number of elements of each chunkable type that have been closed, which is what the preceding axis counts for the next
+    # element opened. This is copied whenever it changes, so that each open element can hold on to the counts from when it was opened.
+    closed_counts = {}
+    # The closed counts when each open element was opened, and the number of chunkable children of each type seen so far
+    open_eles = []
+
+    for event, ele in etree.iterwalk(root_ele, events=("start", "end")):
+        tag = ele.tag
+        # Match on the local name, the same as the XPath count used by get_chunk_filename
+        tag = tag.rpartition("}")[2] if isinstance(tag, basestring) else None
+
+        if event == "end":
+            open_eles.pop()
+            if tag in CHUNKING_ELES:
+                closed_counts = closed_counts.copy()
+                closed_counts[tag] = closed_counts.get(tag, 0) + 1
+            continue
+
+        if tag in CHUNKING_ELES:
+            if open_eles:
+                parent_closed_counts, sibling_counts = open_eles[-1]
+                sibling_counts[tag] = sibling_counts.get(tag, 0) + 1
+                chunk_index[ele] = (sibling_counts[tag], parent_closed_counts.get(tag, 0))
+            else:
+                chunk_index[ele] = (1, 0)
+        open_eles.append((closed_counts, {}))
+
+    return chunk_index
+
+
+def get_chunk_filename(ele, chunk_index=None):
     """
     Gets the chunked filename of a DocBook XML element. If the element isn't a chunkable element, then None is returned.
 
     :param ele:
+    :param chunk_index: An optional index built by build_chunk_index(), to avoid counting the preceding elements.
     :return:
     """
-    tag = ele.tag.replace(LXML_DOCBOOK_NS, "")
+    tag = ele.tag
+    if tag.startswith(LXML_DOCBOOK_NS):
+        tag = tag[len(LXML_DOCBOOK_NS):]
 
     # Check to make sure the element can be chunked
     if tag not in CHUNKING_ELES:
         return None
 
     filename_format = CHUNKING_ELES[tag].get('format')
-    tag_count = ele.xpath("count(preceding-sibling::*[local-name()='" + tag + "'])") + 1
-    if CHUNKING_ELES[tag].get('any_level', False):
-        tag_count += ele.xpath("count(../preceding::*[local-name()='" + tag + "'])")
-    tag_count = int(tag_count)
+    if chunk_index is not None:
+        tag_count, preceding_count = chunk_index[ele]
+        if CHUNKING_ELES[tag].get('any_level', False):
+            tag_count += preceding_count
+    else:
+        tag_count = PRECEDING_SIBLING_COUNT_XPATH(ele, tag=tag) + 1
+        if CHUNKING_ELES[tag].get('any_level', False):
+            tag_count += PRECEDING_COUNT_XPATH(ele, tag=tag)
+        tag_count = int(tag_count)
 
     if CHUNKING_ELES[tag].get('use_alpha', False):
         chunk_name = filename_format.format(utils.convert_num_to_alpha(tag_count))
@@ -386,7 +484,7 @@ def get_chunk_filename(ele):
 
     if CHUNKING_ELES[tag].get('use_parent', False) and ele.getparent() is not None:
         # Get the parents node name and then prefix
-        parent_name = get_chunk_filename(ele.getparent())
+        parent_name = get_chunk_filename(ele.getparent(), chunk_index)
         return parent_name + chunk_name
     else:
         return chunk_name
@@ -396,12 +494,8 @@ def find_ele(parent_ele, name):
     """
     Finds the child DocBook element for the specified name, by checking for both the DocBook 4.x and 5.x versions.
     """
-    for tag_name in [name, LXML_DOCBOOK_NS + name]:
-        ele = parent_ele.find(".//" + tag_name)
-        if ele is not None:
-            return ele
-
-    return None
+    # Look for both versions in a single pass, which stops at the first match
+    return next(parent_ele.iterdescendants(name, LXML_DOCBOOK_NS + name), None)
 
 
 def find_info_ele(parent_ele):
@@ -409,22 +503,18 @@ def find_info_ele(parent_ele):
     Finds the child DocBook info element that relates to the passed XML element.
     """
     parent_ele = utils.ensure_lxml_element(parent_ele)
-    for child in parent_ele.iterchildren():
-        # DocBook 5+ uses just <info> whereas DocBook 4.x uses <bookinfo>
-        if child.tag == LXML_DOCBOOK_NS + "info" or child.tag == (parent_ele.tag + "info"):
-            return child
-    return None
+    # DocBook 5+ uses just <info> whereas DocBook 4.x uses <bookinfo>
+    return next(parent_ele.iterchildren(LXML_DOCBOOK_NS + "info", parent_ele.tag + "info"), None)
 
 
 def get_ele_id(ele):
     """
     Gets the DocBook id of the element, by checking for both the DocBook 4.x and 5.x versions.
     """
-    for id_attr in ['id', LXML_XML_NS + "id"]:
-        if id_attr in ele.attrib:
-            return ele.get(id_attr)
-
-    return None
+    ele_id = ele.get("id")
+    if ele_id is None:
+        ele_id = ele.get(LXML_XML_NS + "id")
+    return ele_id
 
 
 def is_ns_docbook_ver(docbook_ver):
@@ -446,7 +536,7 @@ def get_legalnotice_html_title(legal_notice_ele):
     :param legal_notice_ele: The Legal Notice element to find the title for.
     :return: The legal notice html title element, or None if one couldn't be found
     """
-    title_eles = legal_notice_ele.xpath(".//*[contains(@class,'legalnotice-title')]")
+    title_eles = LEGALNOTICE_TITLE_XPATH(legal_notice_ele)
     if len(title_eles) > 0:
         return title_eles[0]
     else:
@@ -483,14 +573,7 @@ def get_keywords(info_ele):
     :return: A list of keywords defined in the info element
     :rtype: list[str]
     """
-    # Add the keywords
-    keywordset_ele = info_ele.find("keywordset")
-    keywords_list = []
-    if keywordset_ele is not None:
-        for keyword_ele in keywordset_ele.findall("keyword"):
-            keywords_list.append(utils.get_element_text(keyword_ele).strip())
-
-    return keywords_list
+    return [utils.get_element_text(keyword_ele).strip() for keyword_ele in KEYWORDS_XPATH(info_ele)]
 
 
 def build_doctype(tree, entfile=None):
@@ -572,11 +655,60 @@ def strip_block_name_from_title(block_type, title, lang="en"):
     if not isinstance(title, unicode):
         title = title.decode("utf-8")
 
-    try:
-        # Parse the DocBook localization file, to find out how to strip the block name
-        # Note: This uses the DocBook XSL URI which should resolve to a local file depending on the local XML catalog
-        xml_root = etree.parse(DOCBOOK_XSL_URI + "/common/" + lang + ".xml")
+    title_template = _get_title_template(block_type, lang)
+    if title_template is not None:
+        template_re, numbered = title_template
+
+        # Match the template and replace the title with just the number/title
+        match = template_re.match(title)
+        if match:
+            if numbered:
+                return match.expand(u"\g<num>. \g<text>")
+            else:
+                return match.expand(u"\g<text>")
 
+    # Don't do anything and just return the title as is
+    return title
+
+
+def _load_l10n_xml(lang):
+    """
+    Parses the DocBook localization file for a language.
+
+    :param lang: The language code, without the region (ie en, ja, etc...)
+    :type lang: str
+    :return: The parsed localization file, or None if it couldn't be parsed.
+    :rtype: etree._ElementTree
+    """
+    # Cache this, as the localization files won't change while running and parsing them for every title is slow
+    if lang not in _l10n_cache:
+        try:
+            # Note: This uses the DocBook XSL URI which should resolve to a local file depending on the local XML catalog
+            _l10n_cache[lang] = etree.parse(DOCBOOK_XSL_URI + "/common/" + lang + ".xml")
+        except etree.LxmlError:
+            _l10n_cache[lang] = None
+    return _l10n_cache[lang]
+
+
+def _get_title_template(block_type, lang):
+    """
+    Gets the compiled regex to match a rendered title for a block type, using the DocBook localization template for the language.
+
+    :param block_type: The lowercase type of block the title is for (ie chapter, part, section, etc...)
+    :type block_type: str
+    :param lang: The language code, without the region (ie en, ja, etc...)
+    :type lang: str
+    :return: A tuple of the compiled regex and if the template contains a number, or None if no template exists.
+    :rtype: tuple
+    """
+    key = (block_type, lang)
+    # Cache this, so the localization file doesn't have to be searched and the regex compiled for every title
+    if key in _title_template_cache:
+        return _title_template_cache[key]
+
+    title_template = None
+    xml_root = _load_l10n_xml(lang)
+    if xml_root is not None:
         # Get the title context information
         title_context = xml_root.find(LXML_DOCBOOK_L10N_NS + "context[@name='title']")
         title_numbered_context = xml_root.find(LXML_DOCBOOK_L10N_NS + "context[@name='title-numbered']")
@@ -594,17 +726,7 @@ def strip_block_name_from_title(block_type, title, lang="en"):
                 template_re = re.escape(template).replace("\\%n", r"(?P<num>\S+?)").replace("\\%t", r"(?P<text>.+?)")
                 template_re = template_re.replace(u"\\\x0a", "\\s").replace("\\ ", "\\s")
                 template_re = "^" + template_re + "$"
+                title_template = (re.compile(template_re, re.UNICODE), "%n" in template)
 
-                # Match the template and replace the title with just the number/title
-                match = re.match(template_re, title, re.UNICODE)
-                if match:
-                    if "%n" in template:
-                        return match.expand(u"\g<num>. \g<text>")
-                    else:
-                        return match.expand(u"\g<text>")
-    except etree.LxmlError:
-        # Do nothing and use the default return value
-        pass
-
-    # Don't do anything and just return the title as is
-    return title
+    _title_template_cache[key] = title_template
+    return title_template
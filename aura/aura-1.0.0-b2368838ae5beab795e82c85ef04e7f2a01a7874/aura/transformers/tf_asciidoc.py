@@ -14,7 +14,7 @@ from lxml import etree
 from lxml.etree import XMLSyntaxError, XIncludeError
 
 from aura import utils
-from aura.compat import urljoin, StringIO
+from aura.compat import check_output, urljoin, StringIO
 from aura.exceptions import InvalidInputException
 from aura.transformers.tf_publican import PublicanTransformer
 from aura.transformers.publican import utils as publican_utils
@@ -560,11 +560,7 @@ class AsciiDocPublicanTransformer(PublicanTransformer):
         self.log.info("Transforming the AsciiDoc content to DocBook XML...")
         try:
             # AsciiDoctor sometimes doesn't return a non zero exit code when an error occurs, so check the output
-            try:
-                output = subprocess.check_output(asciidoc_cmd, cwd=self.adoc_source_dir, stderr=subprocess.STDOUT)
-            except AttributeError:
-                import aura.compat
-                output = aura.compat.check_output(asciidoc_cmd, cwd=self.adoc_source_dir, stderr=subprocess.STDOUT)
+            output = check_output(asciidoc_cmd, cwd=self.adoc_source_dir, stderr=subprocess.STDOUT)
             if output is not None and len(output) > 0:
                 output = self._correct_asciidoctor_warnings(output)
                 # Apply ANSI colouring to the asciidoctor output
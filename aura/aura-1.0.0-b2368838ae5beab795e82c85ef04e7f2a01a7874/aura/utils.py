@@ -11,10 +11,11 @@ from lxml import etree, html, objectify
 import num2words
 
 from aura import compat
-from aura.compat import unicode, urllib, RawConfigParser
+from aura.compat import unicode, urllib, RawConfigParser, scandir
 
 log = logging.getLogger("aura.utils")
 XML_ID_CLEAN_RE = re.compile(r"[^\w.-]", re.UNICODE)
+_which_cache = {}
 
 
 def save_config(config, filename, mode=0o644):
@@ -315,15 +316,15 @@ def copy_dir_contents(src_dir, dest_dir):
     if not os.path.exists(dest_dir):
         os.makedirs(dest_dir)
 
-    files = os.listdir(src_dir)
-    for filename in files:
-        abs_file = os.path.join(src_dir, filename)
+    for entry in scandir(src_dir):
+        filename = entry.name
+        abs_file = entry.path
         abs_dest_file = os.path.join(dest_dir, filename)
-        if os.path.isdir(abs_file):
+        if entry.is_dir():
             if os.path.exists(abs_dest_file):
                 copy_dir_contents(abs_file, abs_dest_file)
             else:
-                shutil.copytree(abs_file, os.path.join(dest_dir, filename))
+                shutil.copytree(abs_file, abs_dest_file)
         else:
             shutil.copy2(abs_file, dest_dir)
 
@@ -369,6 +370,14 @@ def which(program):
     :param program: The name of the progam to find.
     :return: The path of the program if it exists, other None
     """
+    # Cache this as programs are looked up on every command run, and searching the PATH requires a stat for each directory
+    cache_key = (program, os.environ.get("PATH"))
+    if cache_key not in _which_cache:
+        _which_cache[cache_key] = _find_program(program)
+    return _which_cache[cache_key]
+
+
+def _find_program(program):
     def is_exe(fpath):
         return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
 
@@ -9,9 +9,18 @@ import sys
 from PIL import Image
 import numpy
 
+from aura.compat import check_output
+from aura.hwaccel import HWAccel
+
 
 log = logging.getLogger("aura.video")
 _media_info_cache = {}
+_ffmpeg_encoders_cache = {}
+_hwaccel_usable_cache = {}
+# File descriptors aren't inherited by default on Python 3.4+ (PEP 446) and close_fds already defaults to False on Python 2, so there is no
+# need to close them when spawning ffmpeg/ffprobe. Not doing so lets Python 3.8+ use posix_spawn instead of fork/exec.
+SUBPROCESS_CLOSE_FDS = False
+VAAPI_DEVICE = "/dev/dri/renderD128"
 
 
 def get_media_info(filename):
@@ -25,7 +34,7 @@ def get_media_info(filename):
         return _media_info_cache[filename]
     else:
         cmd = ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", filename]
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, close_fds=SUBPROCESS_CLOSE_FDS)
         out, err = process.communicate()
         rv = process.returncode == 0 and json.loads(out) or None
         _media_info_cache[filename] = rv
@@ -123,23 +132,85 @@ def _transcode(transcoder, input_file, video_format, answer_yes, output_path):
     outfile = prefix + "." + video_format.get_file_extension()
     outfile_sd = prefix + "-SD.mp4"
 
-    # Convert the HD video to the specified format
-    if transcoder.transcode(input_file, outfile, video_format, answer_yes=answer_yes):
+    # Convert the HD video to the specified format and standard definition, using a single ffmpeg process so the input is only decoded once
+    outputs = [(outfile, video_format, None), (outfile_sd, VideoFormat.MP4, Size.LARGE)]
+    if transcoder.transcode_multiple(input_file, outputs, answer_yes=answer_yes):
         log.info("Video successfully converted to %s", video_format.get_name())
-    else:
-        log.error("Failed to convert the video to %s", video_format.get_name())
-        sys.exit(-1)
-
-    # Convert the HD video to standard definition
-    if transcoder.transcode(input_file, outfile_sd, VideoFormat.MP4, Size.LARGE, answer_yes=answer_yes):
         log.info("Video successfully converted to SD from HD")
     else:
-        log.error("Failed to convert the video to standard definition")
+        log.error("Failed to convert the video to %s and standard definition", video_format.get_name())
         sys.exit(-1)
 
     return [outfile, outfile_sd]
 
 
+def get_ffmpeg_encoders(ffmpeg="ffmpeg"):
+    """
+    Gets the names of the encoders supported by ffmpeg.
+
+    :param ffmpeg: The ffmpeg executable to query.
+    :return: A set of encoder names, or an empty set if ffmpeg couldn't be run.
+    """
+    # Cache this as the supported encoders won't change while running
+    if ffmpeg not in _ffmpeg_encoders_cache:
+        try:
+            output = check_output([ffmpeg, "-hide_banner", "-encoders"], close_fds=SUBPROCESS_CLOSE_FDS)
+        except (OSError, subprocess.CalledProcessError):
+            encoders = set()
+        else:
+            # The encoders are listed after a "------" line, with the encoder name as the second column
+            lines = output.decode("utf-8", "replace").partition("------")[2].splitlines()
+            encoders = set(line.split()[1] for line in lines if len(line.split()) > 1)
+        _ffmpeg_encoders_cache[ffmpeg] = encoders
+    return _ffmpeg_encoders_cache[ffmpeg]
+
+
+def can_use_hwaccel(hwaccel, ffmpeg="ffmpeg"):
+    """
+    Checks if a hardware accelerated H.264 encoder can actually be used, by encoding a single test frame. ffmpeg builds often include
+    hardware encoders even when the hardware they need isn't present.
+
+    :param hwaccel: The HWAccel method to check.
+    :param ffmpeg: The ffmpeg executable to use.
+    :return: True if the test frame could be encoded, otherwise False.
+    """
+    # Cache this as the available hardware won't change while running
+    key = (ffmpeg, hwaccel)
+    if key not in _hwaccel_usable_cache:
+        if hwaccel == HWAccel.VAAPI and not os.path.exists(VAAPI_DEVICE):
+            usable = False
+        else:
+            cmd = [ffmpeg, "-hide_banner", "-v", "error"]
+            if hwaccel == HWAccel.VAAPI:
+                cmd.extend(["-vaapi_device", VAAPI_DEVICE])
+            cmd.extend(["-f", "lavfi", "-i", "nullsrc", "-frames:v", "1"])
+            if hwaccel == HWAccel.VAAPI:
+                cmd.extend(["-vf", "format=nv12,hwupload"])
+            cmd.extend(["-c:v", HWAccel.ENCODERS[hwaccel], "-f", "null", "-"])
+            try:
+                check_output(cmd, stderr=subprocess.STDOUT, close_fds=SUBPROCESS_CLOSE_FDS)
+            except (OSError, subprocess.CalledProcessError):
+                usable = False
+            else:
+                usable = True
+        _hwaccel_usable_cache[key] = usable
+    return _hwaccel_usable_cache[key]
+
+
+def detect_hwaccel(ffmpeg="ffmpeg"):
+    """
+    Detects the hardware accelerated H.264 encoder that can be used by ffmpeg.
+
+    :param ffmpeg: The ffmpeg executable to query.
+    :return: The HWAccel method to use, or HWAccel.NONE if no hardware encoder is available.
+    """
+    encoders = get_ffmpeg_encoders(ffmpeg)
+    for hwaccel in (HWAccel.NVENC, HWAccel.VAAPI, HWAccel.VIDEOTOOLBOX):
+        if HWAccel.ENCODERS[hwaccel] in encoders and can_use_hwaccel(hwaccel, ffmpeg):
+            return hwaccel
+    return HWAccel.NONE
+
+
 def get_video_thumbnail(video_file, size=None):
     """
     Gets a frame from a video and returns it as a PIL Image object. The frame that is used, is from within a short time after the start to
@@ -163,7 +234,7 @@ def get_video_thumbnail(video_file, size=None):
     if size:
         command.extend(['-s', size])
     command.append('-')
-    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=buffer_size)
+    pipe = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=buffer_size, close_fds=SUBPROCESS_CLOSE_FDS)
 
     # read W*H*3 bytes (= 1 frame)
     raw_image = pipe.stdout.read(width * height * 3)
@@ -211,10 +282,31 @@ class Size(object):
 
 
 class VideoTranscoder(object):
-    def __init__(self, quiet=False, verbose=False, debug=False):
+    def __init__(self, quiet=False, verbose=False, debug=False, threads=0, ffmpeg="ffmpeg", hwaccel=HWAccel.NONE,
+                 crf=22):
         self.quiet = quiet
         self.debug = debug
         self.verbose = verbose
+        # The number of threads ffmpeg should use, where 0 lets ffmpeg pick based on the number of CPUs
+        self.threads = threads
+        # The ffmpeg executable, which can be a full path if it has already been looked up
+        self.ffmpeg = ffmpeg
+        # The hardware acceleration method to use for H.264 encoding, which is detected on first use when set to auto
+        self.hwaccel = hwaccel
+        # The constant rate factor to use for H.264 encoding, where lower values give a higher quality. Hardware encoders don't support
+        # a constant rate factor, so it's converted to their equivalent quality setting
+        self.crf = crf
+
+    def get_hwaccel(self):
+        """
+        Gets the hardware acceleration method to use for H.264 encoding, detecting what is available if needed.
+
+        :return: The HWAccel method to use.
+        """
+        if self.hwaccel == HWAccel.AUTO:
+            self.hwaccel = detect_hwaccel(self.ffmpeg)
+            log.debug("Using %s hardware acceleration", self.hwaccel)
+        return self.hwaccel
 
     def transcode(self, input_file, output_file, video_format, size=None, answer_yes=False):
         """
@@ -227,46 +319,106 @@ class VideoTranscoder(object):
         :param answer_yes: Whether or not "yes" should be answered for any user input questions from ffmpeg
         :return: True if the video was successfully transcoded, otherwise false
         """
-        additional_args = None
+        return self.transcode_multiple(input_file, [(output_file, video_format, size)], answer_yes)
 
+    def transcode_multiple(self, input_file, outputs, answer_yes=False):
+        """
+        Runs a single ffmpeg process to transcode a input video to multiple output videos, so that the input only has to be decoded once.
+
+        :param input_file: The video to transcode
+        :param outputs: A list of (output_file, video_format, size) tuples for each video to create
+        :param answer_yes: Whether or not "yes" should be answered for any user input questions from ffmpeg
+        :return: True if the videos were successfully transcoded, otherwise false
+        """
         # Get the media info for the input file
         media_info = get_media_info(input_file)
         format_name = media_info["format"]["format_name"]
 
+        # Build the arguments for each output, as ffmpeg applies the options to the output file that follows them
+        output_args = []
+        for output_file, video_format, size in outputs:
+            output_args.extend(self._get_output_args(format_name, video_format, size))
+            output_args.append(output_file)
+
+        # Do the transcode
+        return self._run_ffmpeg(input_file, output_args, answer_yes)
+
+    def _get_output_args(self, input_format_name, video_format, size=None):
+        """
+        Gets the ffmpeg arguments needed to transcode a video to the specified format.
+
+        :param input_format_name: The format name of the input video, as reported by ffprobe
+        :param video_format: The video format to transcode the video to
+        :param size: The size of the frame to use when transcoding
+        :return: A list of ffmpeg output arguments
+        """
+        additional_args = None
+
         # Setup the codecs and additional arguments
         if video_format == VideoFormat.MP4:
-            video_codec = video_format.get_video_codec()
-            if "mp4" in format_name:
+            if "mp4" in input_format_name:
                 audio_codec = "copy"
             else:
                 audio_codec = video_format.get_audio_codec()
-            additional_args = ["-crf", "22", "-threads", "0"]
+
+            hwaccel = self.get_hwaccel()
+            if hwaccel == HWAccel.NONE:
+                video_codec = video_format.get_video_codec()
+                additional_args = ["-crf", str(self.crf)]
+            else:
+                video_codec = HWAccel.ENCODERS[hwaccel]
+                additional_args = self._get_hwaccel_quality_args(hwaccel)
+                if hwaccel == HWAccel.VAAPI:
+                    # VAAPI needs the frames uploaded to the GPU, which has to happen after any scaling
+                    video_filter = "format=nv12,hwupload"
+                    if size is not None:
+                        video_filter = "scale=" + size.replace("x", ":") + "," + video_filter
+                        size = None
+                    additional_args.extend(["-vf", video_filter])
+
+            # Move the index to the start of the file, so the video can start playing before it has been fully downloaded
+            additional_args.extend(["-movflags", "+faststart"])
         else:
             audio_codec = video_format.get_audio_codec()
             video_codec = video_format.get_video_codec()
 
         # Build the arguments
-        args = ["-acodec", audio_codec, "-vcodec", video_codec]
+        args = ["-acodec", audio_codec, "-vcodec", video_codec, "-threads", str(self.threads)]
         if size is not None:
             args.extend(["-s", size])
         if additional_args is not None:
             args.extend(additional_args)
+        return args
 
-        # Do the transcode
-        return self._run_ffmpeg(input_file, output_file, args, answer_yes)
+    def _get_hwaccel_quality_args(self, hwaccel):
+        """
+        Gets the ffmpeg arguments to set the quality of a hardware H.264 encoder, based on the constant rate factor.
 
-    def _run_ffmpeg(self, input_file, output_file, additional_args=None, answer_yes=False):
+        :param hwaccel: The HWAccel method being used
+        :return: A list of ffmpeg output arguments
         """
-        Runs ffmpeg to transcode a input video and saves it as output_file.
+        if hwaccel == HWAccel.VAAPI:
+            # Constant quantization parameter, which uses the same 0-51 scale as the constant rate factor
+            return ["-qp", str(self.crf)]
+        elif hwaccel == HWAccel.NVENC:
+            # Constant quality, which uses the same 0-51 scale as the constant rate factor
+            return ["-cq", str(self.crf)]
+        else:
+            # VideoToolbox uses a 1-100 quality scale, where higher values give a higher quality
+            quality = int(round(100 * (51 - self.crf) / 51.0))
+            return ["-q:v", str(max(quality, 1))]
+
+    def _run_ffmpeg(self, input_file, output_args, answer_yes=False):
+        """
+        Runs ffmpeg to transcode a input video to the output file(s) in output_args.
 
         :param input_file: The video to transcode
-        :param output_file: The output filename to save the transcoded video to
-        :param additional_args: Any additional arguments to pass to ffmpeg
+        :param output_args: The output arguments and filenames to pass to ffmpeg
         :param answer_yes: Whether or not "yes" should be answered for any user input questions from ffmpeg
         :return: True if ffmpeg ran successfully, otherwise false
         """
         # Build the command
-        ffmpeg_cmd = ["ffmpeg"]
+        ffmpeg_cmd = [self.ffmpeg]
 
         # Set the log level for ffmpeg
         if self.debug:
@@ -283,14 +435,22 @@ class VideoTranscoder(object):
         if answer_yes:
             ffmpeg_cmd.append("-y")
 
-        # Set the input/output file and additional args
+        # Set the number of threads to use for decoding and filtering. ffmpeg already defaults to using all CPUs for filters, so only
+        # override it when an explicit number of threads has been asked for
+        if self.threads:
+            ffmpeg_cmd.extend(["-filter_threads", str(self.threads)])
+        ffmpeg_cmd.extend(["-threads", str(self.threads)])
+
+        # Set the device to use for VAAPI hardware acceleration
+        if self.hwaccel == HWAccel.VAAPI:
+            ffmpeg_cmd.extend(["-vaapi_device", VAAPI_DEVICE])
+
+        # Set the input file and output args
         ffmpeg_cmd.extend(["-i", input_file])
-        if additional_args is not None and len(additional_args) > 0:
-            ffmpeg_cmd.extend(additional_args)
-        ffmpeg_cmd.append(output_file)
+        ffmpeg_cmd.extend(output_args)
 
         # Execute the command
-        exit_status = subprocess.call(ffmpeg_cmd)
+        exit_status = subprocess.call(ffmpeg_cmd, close_fds=SUBPROCESS_CLOSE_FDS)
 
         # If quiet we need to print a new line, as one isn't printed by ffmpeg
         if exit_status == 0 and self.quiet:
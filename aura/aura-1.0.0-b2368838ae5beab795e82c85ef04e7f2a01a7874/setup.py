@@ -116,7 +116,9 @@ setup(
                       'numpy',
                       'Pillow',
                       'num2words',
-                      'GitPython'],
+                      'GitPython',
+                      'importlib_metadata; python_version < "3.8"',
+                      'scandir; python_version < "3.5"'],
     entry_points={
         'console_scripts': [
             'aura = aura.cli:cli'
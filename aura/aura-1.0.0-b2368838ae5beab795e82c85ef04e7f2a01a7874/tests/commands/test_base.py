@@ -1,7 +1,8 @@
 import uuid
 
 import pytest
-from aura.commands.base import BaseXMLFeedCommand
+import aura
+from aura.commands.base import BaseCommand, BaseXMLFeedCommand
 
 import base
 
@@ -26,3 +27,31 @@ class TestBaseXMLFeedCommand(base.TestBase):
         assert "--lang is {0}".format(self.lang) in logs
         assert "--format is drupal-book" in logs
         assert "--dry-run is on" in logs
+
+
+class TestBaseCommand(base.TestBase):
+    def test_get_resolved_config(self):
+        # Given a system and user config value for the same option
+        self.ctx.obj['CONFIG'].set(aura.VIDEOS_NAME, "sftp_username", "system")
+        self.ctx.obj['USER_CONFIG'].set(aura.VIDEOS_NAME, "sftp_username", "user")
+        # and a command instance
+        command = BaseCommand(self.ctx)
+
+        # When resolving the config
+        config = command._get_resolved_config()
+
+        # Then the user value should override the system value
+        assert config.get(aura.VIDEOS_NAME, "sftp_username") == "user"
+        # and the other system values should be kept
+        assert config.get(aura.VIDEOS_NAME, "sftp_host") == "sftp.example.com"
+        # and the resolved config is cached in the context
+        assert command._get_resolved_config() is config
+
+    def test_logger_name(self):
+        # Given a command instance
+        command = BaseXMLFeedCommand(self.ctx, "en-US", None, 'drupal-book')
+
+        # Then the logger should be named after the command class
+        assert command.log.name == "aura.commands.base.BaseXMLFeedCommand"
+        # and the same logger is used by each instance
+        assert BaseXMLFeedCommand(self.ctx, "en-US", None, 'drupal-book').log is command.log
@@ -1,4 +1,5 @@
 import os
+import tarfile
 
 import click.exceptions
 import mock
@@ -102,3 +103,27 @@ class TestCompileCommand(base.TestBase):
         except click.exceptions.UsageError as e:
             # Then an error should be printed to the output
             assert "Invalid value for \"--format\": invalid choice: " + build_format in e.message
+
+    def test_archive_build_files(self, tmpdir):
+        # Given some built html files
+        build_dir = tmpdir.mkdir("html")
+        build_dir.join("index.html").write("<html/>")
+        build_dir.mkdir("images").join("icon.svg").write("<svg/>")
+        archives_dir = tmpdir.join("archives")
+        # and we have a compile command instance
+        lang = "en-US"
+        compile_command = CompileCommand(self.ctx, lang, "html")
+        transformer = compile_command.transformer
+
+        # When archiving the built files
+        with mock.patch.object(transformer, "get_doc_id", return_value="Product-1.0-Title-en-US"), \
+                mock.patch.object(transformer, "get_npv", return_value=("Title", "Product", "1.0")), \
+                mock.patch.object(transformer, "get_build_archives_dir", return_value=str(archives_dir)), \
+                mock.patch.object(transformer, "get_build_dir", return_value=str(build_dir)):
+            compile_command.archive_build_files()
+
+        # Then the archive should contain all the built files, relative to the title directory
+        with tarfile.open(str(archives_dir.join("Product-1.0-Title-en-US.tar.gz"))) as archive:
+            names = archive.getnames()
+        assert "Title/html/index.html" in names
+        assert "Title/html/images/icon.svg" in names
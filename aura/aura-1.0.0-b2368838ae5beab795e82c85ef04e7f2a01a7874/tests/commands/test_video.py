@@ -1,3 +1,5 @@
+import subprocess
+
 import mock
 import pytest
 from aura.commands.cmd_video import VideoTranscodeCommand
@@ -48,6 +50,120 @@ class TestVideoTranscodeCommand(base.TestBase):
         assert "Video successfully converted to Ogg" in logs
         assert "Video successfully converted to SD from HD" in logs
 
+    @mock.patch("aura.video.get_media_info")
+    @mock.patch("subprocess.call")
+    def test_transcode_videos_single_ffmpeg_process(self, mock_subprocess_call, mock_media_info):
+        # Given the call to ffmpeg works
+        mock_subprocess_call.return_value = 0
+        # and we have been given a valid video
+        video_file = str(self.video_file)
+        # and the media info is successfully returned
+        mock_media_info.return_value = dict(format=dict(format_name="mp4"))
+        # and a transcoder
+        transcoder = video.VideoTranscoder()
+
+        # When transcoding the video
+        ogv_file, sd_file = video.transcode(transcoder, video_file)
+
+        # Then ffmpeg should only have been run once
+        assert mock_subprocess_call.call_count == 1
+        # and the input should have been decoded once for both outputs
+        ffmpeg_cmd = mock_subprocess_call.call_args[0][0]
+        assert ffmpeg_cmd.count("-i") == 1
+        assert ffmpeg_cmd.index(ogv_file) < ffmpeg_cmd.index("856x480") < ffmpeg_cmd.index(sd_file)
+        # and the SD MP4 should be optimised for streaming
+        assert ffmpeg_cmd.index(ogv_file) < ffmpeg_cmd.index("+faststart") < ffmpeg_cmd.index(sd_file)
+
+    @mock.patch("aura.video.get_media_info")
+    @mock.patch("subprocess.call")
+    def test_transcode_videos_threads(self, mock_subprocess_call, mock_media_info):
+        # Given the call to ffmpeg works
+        mock_subprocess_call.return_value = 0
+        # and we have been given a valid video
+        video_file = str(self.video_file)
+        # and the media info is successfully returned
+        mock_media_info.return_value = dict(format=dict(format_name="mp4"))
+        # and a transcoder that should use 4 threads
+        transcoder = video.VideoTranscoder(threads=4)
+
+        # When transcoding the video
+        video.transcode(transcoder, video_file)
+
+        # Then the threads should have been passed to ffmpeg for the input, filters and each output
+        ffmpeg_cmd = mock_subprocess_call.call_args[0][0]
+        assert ffmpeg_cmd[ffmpeg_cmd.index("-filter_threads") + 1] == "4"
+        assert [ffmpeg_cmd[i + 1] for i, arg in enumerate(ffmpeg_cmd) if arg == "-threads"] == ["4", "4", "4"]
+
+    @mock.patch("aura.video.get_media_info")
+    @mock.patch("subprocess.call")
+    def test_transcode_videos_vaapi(self, mock_subprocess_call, mock_media_info):
+        # Given the call to ffmpeg works
+        mock_subprocess_call.return_value = 0
+        # and we have been given a valid video
+        video_file = str(self.video_file)
+        # and the media info is successfully returned
+        mock_media_info.return_value = dict(format=dict(format_name="mp4"))
+        # and a transcoder that should use VAAPI
+        transcoder = video.VideoTranscoder(hwaccel=video.HWAccel.VAAPI)
+
+        # When transcoding the video
+        ogv_file, sd_file = video.transcode(transcoder, video_file)
+
+        # Then the VAAPI device should have been set before the input
+        ffmpeg_cmd = mock_subprocess_call.call_args[0][0]
+        assert ffmpeg_cmd.index("-vaapi_device") < ffmpeg_cmd.index("-i")
+        # and the Ogg video should still use the software encoder
+        assert ffmpeg_cmd.index("libtheora") < ffmpeg_cmd.index(ogv_file)
+        # and the SD MP4 should be scaled and then encoded using VAAPI
+        sd_args = ffmpeg_cmd[ffmpeg_cmd.index(ogv_file):ffmpeg_cmd.index(sd_file)]
+        assert "h264_vaapi" in sd_args
+        assert "scale=856:480,format=nv12,hwupload" in sd_args
+        assert "-s" not in sd_args
+        # and the constant rate factor should have been used as the quantization parameter
+        assert sd_args[sd_args.index("-qp") + 1] == "22"
+
+    def test_hwaccel_quality_args(self):
+        # Given transcoders that use NVENC and VideoToolbox, with a constant rate factor set
+        nvenc_transcoder = video.VideoTranscoder(hwaccel=video.HWAccel.NVENC, crf=18)
+        videotoolbox_transcoder = video.VideoTranscoder(hwaccel=video.HWAccel.VIDEOTOOLBOX, crf=18)
+
+        # When getting the output arguments for a MP4 video
+        nvenc_args = nvenc_transcoder._get_output_args("mp4", video.VideoFormat.MP4)
+        videotoolbox_args = videotoolbox_transcoder._get_output_args("mp4", video.VideoFormat.MP4)
+
+        # Then the constant rate factor should have been converted to each encoders quality setting
+        assert nvenc_args[nvenc_args.index("-cq") + 1] == "18"
+        assert videotoolbox_args[videotoolbox_args.index("-q:v") + 1] == "65"
+        assert "-crf" not in nvenc_args and "-crf" not in videotoolbox_args
+
+    @mock.patch("aura.video.check_output")
+    def test_detect_hwaccel(self, mock_check_output):
+        # Given ffmpeg supports the NVENC encoder
+        mock_check_output.return_value = b"Encoders:\n V..... = Video\n ------\n V..... libx264    libx264 H.264\n" \
+                                         b" V..... h264_nvenc NVIDIA NVENC H.264 encoder\n"
+
+        # When detecting the hardware acceleration to use
+        hwaccel = video.detect_hwaccel("/test/ffmpeg")
+
+        # Then NVENC should be used
+        assert hwaccel == video.HWAccel.NVENC
+
+    @mock.patch("aura.video.check_output")
+    def test_detect_hwaccel_unusable(self, mock_check_output):
+        # Given ffmpeg supports the NVENC encoder, but the test encode fails as there's no NVIDIA GPU
+        mock_check_output.side_effect = [b"Encoders:\n V..... = Video\n ------\n V..... libx264    libx264 H.264\n"
+                                         b" V..... h264_nvenc NVIDIA NVENC H.264 encoder\n",
+                                         subprocess.CalledProcessError(1, "ffmpeg")]
+
+        # When detecting the hardware acceleration to use
+        hwaccel = video.detect_hwaccel("/test/ffmpeg-no-gpu")
+
+        # Then the software encoder should be used
+        assert hwaccel == video.HWAccel.NONE
+        # and the test encode should have used the NVENC encoder
+        probe_cmd = mock_check_output.call_args_list[1][0][0]
+        assert probe_cmd[probe_cmd.index("-c:v") + 1] == "h264_nvenc"
+
     @mock.patch("aura.video.get_media_info")
     @mock.patch("subprocess.call")
     def test_transcode_videos_ogg_fail(self, mock_subprocess_call, mock_media_info):
@@ -1,7 +1,10 @@
 import logging
+import sys
 
 import aura
 import aura.cli as aura_cli
+import click
+import mock
 from click.testing import CliRunner
 
 import base
@@ -123,3 +126,96 @@ class TestCLI(base.TestBase):
             if handler is not None:
                 root.removeHandler(handler)
             root.setLevel(logging.INFO)
+
+    def test_list_commands(self):
+        # Given the cli application
+        cli = aura_cli.ExtendableCLI()
+
+        # When listing the available commands
+        commands = cli.list_commands(self.ctx)
+
+        # Then the built-in commands should be listed
+        for name in ("clean", "compile", "translate", "video"):
+            assert name in commands
+
+    def test_get_builtin_command(self):
+        # Given the cli application
+        cli = aura_cli.ExtendableCLI()
+
+        # When getting a built-in command
+        command = cli.get_command(self.ctx, "compile")
+
+        # Then the built-in command should be returned
+        from aura.commands import cmd_compile
+        assert command is cmd_compile.cli
+
+    def test_init_user_config(self, tmpdir):
+        # Given a user config file
+        config_file = tmpdir.join("aura.conf")
+        config_file.write("[cli]\ndata_dir = /tmp/first\n")
+
+        # When loading the user config
+        config = aura_cli.init_user_config(self.ctx, str(config_file))
+
+        # Then the config should be stored in the context
+        assert self.ctx.obj['USER_CONFIG'] is config
+        assert config.get("cli", "data_dir") == "/tmp/first"
+
+        # When the file changes and the config is loaded again
+        config_file.write("[cli]\ndata_dir = /tmp/second/\n")
+        config = aura_cli.init_user_config(self.ctx, str(config_file))
+
+        # Then the updated content should be used
+        assert config.get("cli", "data_dir") == "/tmp/second/"
+
+    def test_colored_console_handler(self):
+        # Given a colored console handler
+        handler = aura_cli.ColoredConsoleHandler()
+        handler.setFormatter(self.fmt)
+        # and an error log record
+        record = logging.LogRecord("aura", logging.ERROR, __file__, 1, "Failed %s", ("build",), None)
+
+        # When formatting the record
+        msg = handler.format(record)
+
+        # Then the message should contain the formatted text
+        assert "Failed build" in msg
+        # and the record itself should not have been altered
+        assert record.msg == "Failed %s"
+
+    def test_colored_console_handler_styles(self):
+        # Given a colored console handler
+        handler = aura_cli.ColoredConsoleHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler._colorize = True
+        # and a record with a custom level between warning and error, that includes an exception
+        try:
+            raise ValueError("Bad value")
+        except ValueError:
+            record = logging.LogRecord("aura", 35, __file__, 1, "Failed %s", ("build",), sys.exc_info())
+
+        # When formatting the record
+        msg = handler.format(record)
+
+        # Then the message should have been styled as a warning
+        assert msg.startswith(click.style("Failed build", **aura_cli.WARN_STYLE) + "\n")
+        # and the traceback should not have been styled
+        assert msg.endswith("ValueError: Bad value")
+        # and the record itself should not have been altered
+        assert record.msg == "Failed %s"
+        assert record.args == ("build",)
+
+    @mock.patch.object(aura_cli.ExtendableCLI, "get_plugins")
+    @mock.patch("aura.cli.init_cli")
+    def test_sub_command_help(self, mock_init_cli, mock_get_plugins):
+        # When printing the help for a built-in sub command
+        runner = CliRunner()
+        result = runner.invoke(aura_cli.cli, ["clean", "--help"])
+
+        # Then the help should be printed
+        assert result.exit_code == 0
+        assert "Clean any build data" in result.output
+        # and the cli wasn't initialised
+        assert not mock_init_cli.called
+        # and the plugins weren't looked up
+        assert not mock_get_plugins.called
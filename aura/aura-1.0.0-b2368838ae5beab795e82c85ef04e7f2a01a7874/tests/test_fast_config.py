@@ -0,0 +1,84 @@
+import pytest
+from aura.compat import NoOptionError, NoSectionError, StringIO
+from aura.fast_config import FastConfigParser
+
+
+CONFIG = """# A comment
+[DEFAULT]
+verify_certs = False
+
+[aura]
+data_dir = /tmp/
+Some_Key: some value
+; Another comment
+multiline = first
+    second
+
+[videos]
+sftp_host = sftp.example.com
+"""
+
+
+def parse(content, defaults=None):
+    config = FastConfigParser(defaults=defaults)
+    config.read_file(StringIO(content))
+    return config
+
+
+def test_read_sections_and_options():
+    # Given a config file
+    # When parsing the config
+    config = parse(CONFIG)
+
+    # Then the sections should have been parsed
+    assert config.sections() == ["aura", "videos"]
+    # and the options should be available
+    assert config.get("aura", "data_dir") == "/tmp/"
+    assert config.get("videos", "sftp_host") == "sftp.example.com"
+    # and option names are case insensitive
+    assert config.get("aura", "some_key") == "some value"
+    assert config.has_option("aura", "SOME_KEY")
+    # and continuation lines are appended to the previous value
+    assert config.get("aura", "multiline") == "first\nsecond"
+
+
+def test_defaults():
+    # Given a config with defaults
+    config = parse(CONFIG, defaults={"timeout": "30"})
+
+    # Then the defaults should be available in every section
+    assert config.get("videos", "timeout") == "30"
+    assert config.getboolean("videos", "verify_certs") is False
+    assert ("timeout", "30") in config.items("aura")
+    # and sections override the defaults
+    config.set("aura", "verify_certs", "True")
+    assert config.getboolean("aura", "verify_certs") is True
+
+
+def test_missing_section_or_option():
+    # Given a config
+    config = parse(CONFIG)
+
+    # Then missing sections and options should raise the same errors as ConfigParser
+    with pytest.raises(NoSectionError):
+        config.get("missing", "data_dir")
+    with pytest.raises(NoOptionError):
+        config.get("aura", "missing")
+    assert not config.has_option("missing", "data_dir")
+    # unless a fallback is provided
+    assert config.get("aura", "missing", fallback=None) is None
+
+
+def test_write_round_trip():
+    # Given a config
+    config = parse(CONFIG)
+
+    # When writing the config and reading it back in
+    output = StringIO()
+    config.write(output)
+    result = parse(output.getvalue())
+
+    # Then the content should be the same
+    assert result.sections() == config.sections()
+    for section in config.sections():
+        assert result.items(section) == config.items(section)
@@ -37,6 +37,25 @@ def test_find_file_for_type_with_empty_dir(mock_listdir, tmpdir):
     mock_listdir.assert_called_once_with(base_dir)
 
 
+def test_which(tmpdir):
+    # Given a program on the PATH
+    program = tmpdir.join("aura-test-program")
+    program.write("")
+    program.chmod(0o755)
+
+    with mock.patch.dict(os.environ, {"PATH": str(tmpdir)}):
+        # When finding the program
+        result = utils.which("aura-test-program")
+
+        # Then the full path should be returned
+        assert result == str(program)
+
+        # and the PATH shouldn't be searched again on subsequent calls
+        with mock.patch("os.path.isfile") as mock_isfile:
+            assert utils.which("aura-test-program") == str(program)
+            assert not mock_isfile.called
+
+
 def test_get_element_text_with_child_elements():
     # Given a parent element
     parent = etree.Element("productname")
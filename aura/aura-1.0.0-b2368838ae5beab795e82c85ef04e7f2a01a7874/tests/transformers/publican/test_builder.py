@@ -9,7 +9,7 @@ from aura import utils
 from aura.compat import StringIO
 from aura.transformers.publican.builder import XMLFeedBuilder, XMLFeedPageBuilder, XMLFeedBuilderContext, PROTOCOL_V2
 from aura.transformers.tf_publican import PublicanTransformer
-from lxml import etree
+from lxml import etree, html
 
 import base
 
@@ -483,6 +483,45 @@ class TestPublicanXMLFeedPageBuilder(base.TestBase):
         assert page_ele[1].tag == "page_slug"
         assert page_ele[1].text == "legal-notice"
 
+    def test_clean_body_content_title_in_toc(self):
+        # Given a html body where the title is the only content in a table of contents
+        body_ele = html.fromstring("<body><div class=\"toc\"><div class=\"titlepage\"><h2 class=\"title\">T</h2></div></div>"
+                                   "<p>x</p></body>")
+        # and a builder instance
+        page_builder = XMLFeedPageBuilder(self.context, None, "sect-test-id", -15)
+
+        # When cleaning the body content
+        page_builder._clean_body_content(body_ele)
+
+        # Then the title and table of contents should have been removed
+        assert [child.tag for child in body_ele] == ["p"]
+
+    def test_clean_body_content_image_links(self):
+        # Given a html body with images and objects that link to files
+        body_ele = html.fromstring("<body><div>\n"
+                                   "  <img src=\"images/a.png\" longdesc=\"desc.html\" usemap=\"#map\"/>\n"
+                                   "  <object classid=\"clsid:1\" data=\"images/b.svg\" type=\"image/svg+xml\"/>\n"
+                                   "  <object codebase=\"media/\" data=\"c.swf\"/>\n"
+                                   "</div></body>")
+        # and a builder instance
+        page_builder = XMLFeedPageBuilder(self.context, None, "sect-test-id", -15)
+
+        # When cleaning the body content
+        page_builder._clean_body_content(body_ele)
+
+        # Then all the image and object links should have the image path prefixed
+        prefix = self.context.image_path_prefix
+        img_ele = body_ele.find(".//img")
+        assert img_ele.get("src") == prefix + "images/a.png"
+        assert img_ele.get("longdesc") == prefix + "desc.html"
+        assert img_ele.get("usemap") == prefix + "#map"
+        object_eles = body_ele.findall(".//object")
+        assert object_eles[0].get("classid") == prefix + "clsid:1"
+        assert object_eles[0].get("data") == prefix + "images/b.svg"
+        # and the object links should be relative to the codebase
+        assert object_eles[1].get("codebase") == prefix + "media/"
+        assert object_eles[1].get("data") == prefix + "media/c.swf"
+
     def test_add_page_keywords(self):
         # Given a source element with some keywords
         src_ele = etree.parse(StringIO("<section id=\"sect-test-id\">\n"
@@ -1,4 +1,5 @@
 # coding=utf-8
+import pytest
 from lxml import etree
 
 from aura.transformers.publican import utils
@@ -95,6 +96,25 @@ class TestPublicanUtils(base.TestBase):
         # Then make sure the correct language is returned
         assert xml_lang == "ja-JP"
 
+    def test_load_publican_config_reloads_changed_file(self, publican_info):
+        # Given a publican.cfg file that has been loaded
+        publican_cfg = publican_info['cfg']
+        publican_cfg.write("xml_lang: ja-JP")
+        publican_cfg_path = str(publican_cfg)
+        utils.load_publican_config(publican_cfg_path)
+        utils.load_publican_settings(publican_cfg_path)
+
+        # When the file is changed and loaded again
+        publican_cfg.write("xml_lang: en-US\n"
+                           "type: Article")
+        publican_config = utils.load_publican_config(publican_cfg_path)
+
+        # Then make sure the new content is used
+        assert utils.get_config_val(publican_config, 'xml_lang') == "en-US"
+        assert utils.get_config_val(publican_config, 'type') == "Article"
+        # and the settings were loaded again
+        assert utils.get_type(publican_cfg_path) == "Article"
+
     def test_get_type(self, publican_info):
         # Given a publican.cfg file, with a xml_lang set
         publican_cfg = publican_info['cfg']
@@ -147,6 +167,39 @@ class TestPublicanUtils(base.TestBase):
         # Then make sure the correct depth is returned
         assert toc_section_depth == "1"
 
+    def test_load_publican_settings(self, publican_info):
+        # Given a publican.cfg file, with some settings set
+        publican_cfg = publican_info['cfg']
+        publican_cfg.write("xml_lang: ja-JP\n"
+                           "type: Article\n"
+                           "dtdver: \"5.0\"")
+        publican_cfg_path = str(publican_cfg)
+
+        # When loading the settings
+        settings = utils.load_publican_settings(publican_cfg_path)
+
+        # Then make sure the settings are returned, using the defaults for any that aren't set
+        assert settings == utils.PublicanSettings(dtdver="5.0", xml_lang="ja-JP", type="Article", brand="common",
+                                                  chunk_section_depth="4", toc_section_depth="2")
+        # and the same settings are returned when loaded again
+        assert utils.load_publican_settings(publican_cfg_path) is settings
+
+    def test_load_publican_settings_invalid_dtdver(self, publican_info):
+        # Given a publican.cfg file, with an invalid dtdver
+        publican_cfg = publican_info['cfg']
+        publican_cfg.write("type: Article\n"
+                           "dtdver: invalid")
+        publican_cfg_path = str(publican_cfg)
+
+        # When getting the other settings
+        doc_type = utils.get_type(publican_cfg_path)
+
+        # Then they should still be returned
+        assert doc_type == "Article"
+        # and only getting the dtdver should fail
+        with pytest.raises(ValueError):
+            utils.get_dtdver(publican_cfg_path)
+
     def test_get_keywords(self):
         # Given some info xml content with keywords
         info_ele = etree.fromstring("<sectioninfo>\n"
@@ -163,6 +216,28 @@ class TestPublicanUtils(base.TestBase):
         # Then expect the keywords list to contain the keywords
         assert keywords_list == ["hornetq", "messaging"]
 
+    def test_get_chunk_filename_with_chunk_index(self):
+        # Given some xml content with chunkable elements at different levels
+        root_ele = etree.fromstring("<book>\n"
+                                    "  <bookinfo><legalnotice/></bookinfo>\n"
+                                    "  <part>\n"
+                                    "    <chapter><section/><section><section/></section></chapter>\n"
+                                    "    <chapter/>\n"
+                                    "  </part>\n"
+                                    "  <chapter><section/></chapter>\n"
+                                    "  <part><appendix/></part>\n"
+                                    "  <appendix/>\n"
+                                    "</book>")
+
+        # When building the chunk index
+        chunk_index = utils.build_chunk_index(root_ele)
+
+        # Then expect the filenames to match those generated without the index
+        filenames = [utils.get_chunk_filename(ele) for ele in root_ele.iter() if ele in chunk_index]
+        assert [utils.get_chunk_filename(ele, chunk_index) for ele in root_ele.iter() if ele in chunk_index] == filenames
+        assert filenames == ["bk01", "ln01", "pt01", "ch01", "ch01s01", "ch01s02", "ch01s02s01", "ch02", "ch01", "ch01s01", "pt02", "apa",
+                             "apa"]
+
     def test_strip_block_name_from_title(self):
         # Given some test data
         test_chapter = ("chapter", u"Chapter\xa01.\xa0Overview")
@@ -0,0 +1,126 @@
+import logging
+
+import mock
+from aura import transformers
+from aura.transformers.tf_asciidoc import AsciiDocPublicanTransformer
+from aura.transformers.tf_publican import PublicanTransformer
+
+
+def test_init_transformer_for_source_format():
+    # When initialising a transformer for a source format
+    transformer = transformers.init_transformer("asciidoc")
+
+    # Then the transformer for that format should be returned
+    assert isinstance(transformer, AsciiDocPublicanTransformer)
+
+
+def test_init_transformer_detects_source_format(tmpdir):
+    # Given a directory that contains AsciiDoc content
+    tmpdir.join("README.txt").write("")
+    tmpdir.join("master.adoc").write("")
+
+    # When initialising a transformer without a source format
+    with tmpdir.as_cwd():
+        transformer = transformers.init_transformer()
+
+    # Then the AsciiDoc transformer should be returned
+    assert isinstance(transformer, AsciiDocPublicanTransformer)
+
+
+def test_init_transformer_prefers_publican(tmpdir):
+    # Given a directory that contains a publican.cfg and AsciiDoc content
+    tmpdir.join("master.adoc").write("")
+    tmpdir.join("publican.cfg").write("")
+
+    # When initialising a transformer without a source format
+    with tmpdir.as_cwd():
+        transformer = transformers.init_transformer()
+
+    # Then the Publican transformer should be returned, as it is registered first
+    assert type(transformer) is PublicanTransformer
+
+
+def test_init_transformer_creates_new_instances():
+    # When initialising the same transformer multiple times
+    transformer1 = transformers.init_transformer("publican")
+    transformer2 = transformers.init_transformer("publican")
+
+    # Then each call should get its own instance
+    assert isinstance(transformer1, PublicanTransformer)
+    assert isinstance(transformer2, PublicanTransformer)
+    assert transformer1 is not transformer2
+
+
+def test_get_transformers():
+    # When getting the available transformers
+    formats = transformers.get_transformers()
+
+    # Then the built-in transformers should be included
+    assert "publican" in formats
+    assert "asciidoc" in formats
+
+    # and the plugins shouldn't be looked up again when getting the transformers or importing one
+    with mock.patch("aura.transformers.entry_points") as mock_entry_points:
+        transformers.import_transformer("publican")
+        assert sorted(transformers.get_transformers()) == sorted(formats)
+        assert not mock_entry_points.called
+
+
+def test_docs_metadata_str():
+    # Given some metadata
+    metadata = transformers.DocsMetadata()
+    metadata.title = "Test Book"
+    metadata.keywords = ["docs", "test"]
+    metadata.source.markup = "asciidoc"
+    metadata.bugs.product = "Test Product"
+
+    # When converting the metadata to a string
+    metadata_str = str(metadata)
+
+    # Then each section should be included in order, with missing values left empty
+    assert metadata_str.startswith("[source]\nlang = en-US\ntype = Book\nmainfile = \nmarkup = asciidoc\n\n[metadata]\ntitle = Test Book\n")
+    assert "keywords = docs, test\nabstract = \n\n[bugs]\n" in metadata_str
+    assert metadata_str.endswith("product = Test Product\nversion = \ncomponent = \n")
+
+
+def test_docs_metadata_verify(caplog):
+    # Given some metadata that is missing the product and abstract
+    metadata = transformers.DocsMetadata()
+    metadata.filepath = "docs.cfg"
+    metadata.title = "Test Book"
+    metadata.subtitle = "A test book"
+    metadata.version = "1.0"
+
+    # When verifying the metadata
+    with caplog.at_level(logging.ERROR):
+        valid = metadata.verify()
+
+    # Then it should fail
+    assert not valid
+    # and an error should have been logged for each missing field
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["Missing product name metadata. Please ensure the product name is defined in docs.cfg, eg. product = value",
+                        "Missing abstract metadata. Please ensure the abstract is defined in docs.cfg, eg. abstract = value"]
+
+
+def test_refresh_plugins():
+    # Given a plugin has been registered
+    plugin = mock.Mock()
+    plugin.name = "test-plugin"
+    formats = transformers.FORMATS
+
+    try:
+        with mock.patch("aura.transformers.entry_points", return_value=[plugin]):
+            # When refreshing the plugins
+            transformers.refresh_plugins()
+
+            # Then the plugin should be available
+            assert transformers.get_plugins() == {"test-plugin": plugin}
+            # and the available formats should have been updated in place
+            assert "test-plugin" in transformers.FORMATS
+            assert transformers.FORMATS is formats
+            assert "publican" in transformers.FORMATS
+    finally:
+        transformers.refresh_plugins()
+
+    assert "test-plugin" not in transformers.FORMATS